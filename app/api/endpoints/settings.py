@@ -6,6 +6,10 @@ from app.db.session import get_db
 from app.api.deps import get_current_user, get_current_admin_user
 from app.core.config import settings, load_config
 from app.models.database import User
+from app.services.scheduler import scheduler
+from app.services.llm_cache import llm_cache
+from app.services.ai import ai_client
+from app.services.file_rules import file_rules
 from pathlib import Path
 import yaml
 import logging
@@ -72,6 +76,66 @@ async def get_settings_page(
         }
     )
 
+@router.get("/jobs")
+async def get_job_metrics(
+    request: Request,
+    db: AsyncSession = Depends(get_db)
+):
+    """获取后台任务的运行统计（仅管理员）"""
+    admin_user, error = await get_current_admin_user(request, db)
+    if error:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail=error
+        )
+
+    return scheduler.get_metrics()
+
+@router.get("/llm-cache")
+async def get_llm_cache_stats(
+    request: Request,
+    db: AsyncSession = Depends(get_db)
+):
+    """获取AI缓存的命中统计（仅管理员）"""
+    admin_user, error = await get_current_admin_user(request, db)
+    if error:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail=error
+        )
+
+    return await llm_cache.get_stats()
+
+@router.get("/llm")
+async def get_llm_metrics(
+    request: Request,
+    db: AsyncSession = Depends(get_db)
+):
+    """获取AI请求的排队和限流统计（仅管理员）"""
+    admin_user, error = await get_current_admin_user(request, db)
+    if error:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail=error
+        )
+
+    return ai_client.get_metrics()
+
+@router.get("/classification")
+async def get_classification_stats(
+    request: Request,
+    db: AsyncSession = Depends(get_db)
+):
+    """获取文件分类方式的统计（仅管理员）"""
+    admin_user, error = await get_current_admin_user(request, db)
+    if error:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail=error
+        )
+
+    return await file_rules.get_stats(db)
+
 @router.post("/update", response_class=HTMLResponse)
 async def update_settings(
     request: Request,
@@ -17,6 +17,8 @@ from app.schemas.source import (
 from app.models.database import User, Torrent, Source as SourceModel
 from app.core.config import settings
 from app.services.scheduler import scheduler
+from app.services.feed_stats import feed_stats
+from app.services.seen_items import seen_items
 import logging
 
 router = APIRouter()
@@ -35,12 +37,15 @@ async def list_sources_page(
             
     # 获取所有来源
     sources = await source.get_multi_by_user(db, user_id=user.id)
+    # 获取RSS源的抓取统计
+    stats = await feed_stats.get_stats(db, [s.id for s in sources if s.type == "RSS"])
     
     return templates.TemplateResponse(
         "source_list.html", 
         {
             "request": request,
             "sources": sources,
+            "stats": stats,
             "username": user.username,
             "is_admin": user.is_admin
         }
@@ -79,7 +84,10 @@ async def create_source(
     if error:
         return RedirectResponse(url="/api/auth/login", status_code=status.HTTP_303_SEE_OTHER)
     logging.info(f"创建新的来源: {source_in}")
-    return await source.create_with_user(db, user_id=user.id, obj_in=source_in.model_dump())
+    db_obj = await source.create_with_user(db, user_id=user.id, obj_in=source_in.model_dump())
+    if db_obj.type == "RSS":
+        await scheduler.manual_check(db_obj.id)
+    return db_obj
 
 @router.post("/analyze", response_model=AnalyzeSourceResponse)
 async def analyze_source(
@@ -179,11 +187,17 @@ async def reset_source_check_time(
     # 更新为很早的时间，确保下次检查会处理所有内容
     from datetime import datetime, timezone
     past_time = datetime(2000, 1, 1, tzinfo=timezone.utc)
-    await source.update(db, db_obj=db_obj, obj_in={"last_check": past_time})
+    await source.update(
+        db,
+        db_obj=db_obj,
+        obj_in={"last_check": past_time, "next_check_at": None, "is_paused": False, "idle_checks": 0}
+    )
+
+    # 清空已处理条目的索引，否则之前处理过的条目（包括已删除的种子）不会被重新添加
+    await seen_items.clear(source_id)
 
     # manual re-echeck asynchrously
-    import asyncio
-    asyncio.create_task(scheduler.manual_check())
+    await scheduler.manual_check(source_id)
     
     logger.info(f"已重置来源 ID:{source_id} 的检查时间")
     return {"status": "success", "message": "已重置来源的检查时间"}
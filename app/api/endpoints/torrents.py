@@ -8,6 +8,8 @@ from app.db.session import get_db, async_session
 from app.api.deps import get_current_user, get_current_admin_user
 from app.services.download_manager import download_manager
 from app.models.database import User, Torrent
+from app.core.config import settings
+import hmac
 import logging
 import os
 from pydantic import BaseModel
@@ -90,6 +92,41 @@ async def get_torrents(
         for torrent in torrents
     ]
 
+async def _verify_hook_request(request: Request, db: AsyncSession) -> bool:
+    """校验回调请求：匹配配置的回调令牌，或者来自已登录用户"""
+    expected = settings.download.webhook_token
+    if expected:
+        provided = request.headers.get("X-Webhook-Token") or request.query_params.get("token") or ""
+        if hmac.compare_digest(provided.encode(), expected.encode()):
+            return True
+    user, error = await get_current_user(request, db)
+    return user is not None
+
+@router.post("/hooks/completed/{torrent_hash}")
+async def torrent_completed_hook(
+    torrent_hash: str,
+    request: Request,
+    db: AsyncSession = Depends(get_db)
+):
+    """qBittorrent下载完成回调，立即处理完成的种子"""
+    if not await _verify_hook_request(request, db):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="回调令牌无效"
+        )
+
+    torrent = await download_manager.get_torrent_by_hash(db, torrent_hash)
+    if not torrent:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="种子不存在"
+        )
+
+    await download_manager.complete_torrent(torrent.id)
+
+    logger.info(f"收到种子 {torrent_hash} 的下载完成回调")
+    return {"status": "success", "message": "已加入处理队列", "torrent_id": torrent.id}
+
 @router.delete("/{torrent_id}")
 async def delete_torrent(
     torrent_id: int,
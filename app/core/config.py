@@ -18,6 +18,8 @@ class DownloadConfig(BaseModel):
     qbittorrent_password: str = "adminadmin"
     # 添加下载目录和目标目录配置
     download_dir: str = ""
+    # qBittorrent下载完成回调的令牌，为空时回调只接受已登录用户的请求
+    webhook_token: str = ""
 
 class HardlinkConfig(BaseModel):
     enable: bool
@@ -37,10 +39,56 @@ class LLMConfig(BaseModel):
     url: str
     token: str
     model_name: str = "gpt-3.5-turbo"  # 默认使用gpt-3.5-turbo
+    cache_enable: bool = True  # 缓存AI的分析结果，相同的输入不再重复请求
+    cache_ttl: int = 2592000  # 缓存有效期（秒）
+    cache_max_entries: int = 20000  # 缓存的最大条数，超出时淘汰最久未使用的记录
+    batch_size: int = 50  # 批量分类文件时每次请求的最大文件数
+    max_concurrency: int = 4  # 同时进行的请求数上限
+    requests_per_minute: int = 60  # 每分钟请求数上限，0为不限制
+    tokens_per_minute: int = 0  # 每分钟token数上限（按提示词长度估算，收到回复后按实际用量修正），0为不限制
+    max_retries: int = 3  # 最大尝试次数
+    retry_base: float = 1.0  # 重试的基础等待时间（秒），按指数退避并加入随机抖动
+    retry_max: float = 60.0  # 重试的最大等待时间（秒），服务返回Retry-After时以其为准
+    search_timeout: int = 15  # 搜索动漫信息的超时时间（秒）
+    search_cache_ttl: int = 604800  # 搜索结果的缓存有效期（秒）
 
 class EnhancementConfig(BaseModel):
     enable_sr: bool
 
+class SchedulerConfig(BaseModel):
+    rss_concurrency: int = 16  # 同时抓取的RSS源数量上限
+    rss_per_host_limit: int = 2  # 同一主机同时抓取的RSS源数量上限
+    rss_retry_interval: int = 60  # RSS源抓取失败或为空时的重试间隔（秒）
+    rss_stop_at_known: bool = True  # 解析RSS时遇到已处理的条目即停止，关闭时只跳过已处理的条目
+    seen_items_per_source: int = 2000  # 每个RSS源保留的已处理条目索引记录数
+    torrent_sync_interval: int = 60  # 种子状态轮询间隔（秒），配置完成回调后可以调大
+    torrent_resync_interval: int = 600  # 种子状态增量同步之间强制全量同步的间隔（秒）
+    rss_reconcile_interval: int = 300  # 从数据库重新加载RSS检查计划的间隔（秒）
+    job_workers: int = 4  # 处理下载完成任务的worker数量
+    job_lease_seconds: int = 600  # 任务租约时长（秒），worker崩溃后任务在租约到期后被重新领取
+    job_max_attempts: int = 5  # 任务最大执行次数
+    job_retry_base: int = 30  # 任务失败后重试的基础等待时间（秒），按指数退避
+    job_retry_max: int = 3600  # 任务重试的最大等待时间（秒）
+    job_poll_interval: int = 5  # 队列为空时worker检查新任务的间隔（秒）
+    leader_lease_seconds: int = 30  # 调度租约时长（秒），主进程退出后其他进程最多等待这么久接管
+    leader_renew_interval: int = 10  # 调度租约续期间隔（秒）
+    adaptive_polling: bool = True  # 根据条目发布规律自适应调整RSS检查间隔
+    cadence_min_interval: int = 600  # 预计更新时间附近的检查间隔（秒）
+    cadence_max_interval: int = 259200  # 错过预计更新后退避的最大检查间隔（秒）
+    cadence_window: int = 10800  # 预计更新时间前后的密集检查窗口（秒）
+    cadence_pause_after_weeks: int = 8  # 超过多少周没有新条目自动暂停
+
+class HTTPConfig(BaseModel):
+    dns_cache_ttl: int = 300  # DNS缓存时间（秒）
+    connect_timeout: int = 10  # 建立连接的超时时间（秒）
+    keepalive_timeout: int = 60  # 空闲连接保持时间（秒）
+    rss_limit: int = 32  # RSS和种子文件下载的最大连接数
+    rss_timeout: int = 30  # RSS和种子文件请求的总超时时间（秒）
+    tmdb_limit: int = 8  # TMDB的最大连接数
+    tmdb_timeout: int = 30  # TMDB请求的总超时时间（秒）
+    llm_limit: int = 4  # LLM服务的最大连接数
+    llm_timeout: int = 120  # LLM请求的总超时时间（秒）
+
 class Settings(BaseModel):
     general: GeneralConfig
     download: DownloadConfig
@@ -49,6 +97,8 @@ class Settings(BaseModel):
     tmdb_api: TMDBConfig
     llm: LLMConfig
     enhancement: EnhancementConfig
+    scheduler: SchedulerConfig = SchedulerConfig()
+    http: HTTPConfig = HTTPConfig()
 
 def load_config() -> Settings:
     config_path = Path("config/settings.yaml")
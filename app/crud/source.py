@@ -1,4 +1,5 @@
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
+from datetime import datetime, timedelta
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, update, delete
 from app.models.database import Source
@@ -59,9 +60,19 @@ class CRUDSource(CRUDBase[Source, SourceBase, SourceUpdate]):
     async def update_last_check(
         self, db: AsyncSession, *, db_obj: Source
     ) -> Source:
-        """更新最后检查时间"""
-        from datetime import datetime
+        """更新最后检查时间，并按检查间隔安排下次检查"""
         db_obj.last_check = datetime.utcnow()
+        db_obj.next_check_at = db_obj.last_check + timedelta(seconds=db_obj.check_interval)
+        db.add(db_obj)
+        await db.commit()
+        await db.refresh(db_obj)
+        return db_obj
+
+    async def update_next_check(
+        self, db: AsyncSession, *, db_obj: Source, next_check_at: Optional[datetime]
+    ) -> Source:
+        """更新下次检查时间"""
+        db_obj.next_check_at = next_check_at
         db.add(db_obj)
         await db.commit()
         await db.refresh(db_obj)
@@ -77,6 +88,39 @@ class CRUDSource(CRUDBase[Source, SourceBase, SourceUpdate]):
         )
         return list(result.scalars().all())
 
+    async def get_rss_sources_by_ids(
+        self, db: AsyncSession, *, ids: List[int]
+    ) -> List[Source]:
+        """获取指定ID的未暂停RSS源"""
+        if not ids:
+            return []
+        result = await db.execute(
+            select(self.model)
+            .where(Source.type == "RSS", Source.is_paused == False, Source.id.in_(ids))  # noqa: E712
+        )
+        return list(result.scalars().all())
+
+    async def get_rss_schedule(
+        self, db: AsyncSession
+    ) -> List[Tuple[int, Optional[datetime]]]:
+        """获取所有未暂停RSS源的(ID, 下次检查时间)，None表示应立即检查"""
+        result = await db.execute(
+            select(
+                Source.id,
+                Source.next_check_at,
+                Source.last_check,
+                Source.check_interval
+            )
+            .where(Source.type == "RSS", Source.is_paused == False)  # noqa: E712
+        )
+        schedule = []
+        for source_id, next_check_at, last_check, check_interval in result.all():
+            # 兼容没有next_check_at的旧数据
+            if next_check_at is None and last_check is not None:
+                next_check_at = last_check + timedelta(seconds=check_interval)
+            schedule.append((source_id, next_check_at))
+        return schedule
+
 source = CRUDSource(Source)
 
 async def get_source(db: AsyncSession, source_id: int) -> Optional[Source]:
@@ -1,5 +1,6 @@
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy import inspect, literal
 from app.models.database import Base
 import logging
 
@@ -12,6 +13,7 @@ DATABASE_URL = "sqlite+aiosqlite:///./aibangumi.db"
 engine = create_async_engine(
     DATABASE_URL,
     echo=False,  # Disable echo to prevent info logs
+    connect_args={"timeout": 30},  # 多个worker并发写入时等待锁而不是立即报错
 )
 
 AsyncSessionLocal = sessionmaker(
@@ -23,9 +25,46 @@ AsyncSessionLocal = sessionmaker(
 # 添加 async_session 实例
 async_session = AsyncSessionLocal
 
+def _add_missing_columns(conn):
+    """为已存在的表补充新增的列和索引（SQLite不会在create_all时修改已有表）"""
+    inspector = inspect(conn)
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            column_type = column.type.compile(dialect=conn.dialect)
+            ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"
+            if column.default is not None and column.default.is_scalar:
+                default = literal(column.default.arg).compile(
+                    dialect=conn.dialect,
+                    compile_kwargs={"literal_binds": True}
+                )
+                ddl += f" DEFAULT {default}"
+            logging.info(f"数据库迁移: {ddl}")
+            conn.exec_driver_sql(ddl)
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+def _dedupe_active_jobs(conn):
+    """创建未完成任务的唯一索引之前，将旧版本可能重复添加的未完成任务标记为失败，只保留最早的一个"""
+    if not inspect(conn).has_table("job"):
+        return
+    result = conn.exec_driver_sql(
+        "UPDATE job SET status = 'failed', last_error = '重复的任务' "
+        "WHERE status IN ('pending', 'running') AND id NOT IN ("
+        "SELECT MIN(id) FROM job WHERE status IN ('pending', 'running') GROUP BY kind, dedupe_key)"
+    )
+    if result.rowcount:
+        logging.info(f"数据库迁移: 标记了 {result.rowcount} 个重复的任务")
+
 async def init_db():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(_dedupe_active_jobs)
+        await conn.run_sync(_add_missing_columns)
 
 async def get_db():
     async with AsyncSessionLocal() as session:
@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import String, Boolean, ForeignKey, DateTime, Float, Text
+from sqlalchemy import String, Boolean, ForeignKey, DateTime, Float, Text, UniqueConstraint, Index, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.db.base_class import Base
@@ -23,12 +23,23 @@ class Source(Base):
     use_ai_episode: Mapped[bool] = mapped_column(Boolean, default=False)  # 是否使用AI提取剧集
     episode_regex: Mapped[str | None] = mapped_column(String, nullable=True)  # 剧集正则表达式
     episode_offset: Mapped[int] = mapped_column(default=0)  # 剧集偏移量
+    learned_episode_regex: Mapped[str | None] = mapped_column(String, nullable=True)  # 使用AI时自动生成的剧集正则表达式
+    learned_regex_checks: Mapped[int] = mapped_column(default=0)  # 自动生成的正则表达式与AI结果一致的次数
+    learned_regex_failures: Mapped[int] = mapped_column(default=0)  # 连续生成正则表达式失败的次数
+    learned_regex_failed_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)  # 生成正则表达式失败次数达到上限的时间
     
     # 其他设置
     enable_sr: Mapped[bool] = mapped_column(Boolean, default=False)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     last_check: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)  # RSS最后检查时间
     check_interval: Mapped[int] = mapped_column(default=3600)  # RSS检查间隔（秒）
+    next_check_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True, index=True)  # RSS下次检查时间
+
+    # 自适应检查节奏
+    last_item_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)  # 最新条目的发布时间
+    publish_history: Mapped[str | None] = mapped_column(Text, nullable=True)  # 最近条目的发布时间（JSON列表）
+    idle_checks: Mapped[int] = mapped_column(default=0)  # 连续没有新条目的检查次数
+    is_paused: Mapped[bool] = mapped_column(Boolean, default=False)  # 长期没有新条目时自动暂停
     
     # 关系
     torrents: Mapped[list["Torrent"]] = relationship(
@@ -37,6 +48,17 @@ class Source(Base):
         cascade="all, delete-orphan",  # 当Source被删除时，删除所有关联的Torrent
         passive_deletes=True  # 启用数据库级别的级联删除
     )
+    seen_items: Mapped[list["SeenItem"]] = relationship(
+        "SeenItem",
+        back_populates="source",
+        cascade="all, delete-orphan"  # SQLite默认不启用外键约束，由ORM删除，避免新源复用ID时继承旧记录
+    )
+    feed_stat: Mapped["FeedStat | None"] = relationship(
+        "FeedStat",
+        back_populates="source",
+        uselist=False,
+        cascade="all, delete-orphan"
+    )
 
 class Torrent(Base):
     hash: Mapped[str] = mapped_column(String, unique=True, index=True)
@@ -74,6 +96,7 @@ class File(Base):
     is_valid_episode: Mapped[bool | None] = mapped_column(Boolean, nullable=True)  # 是否为正片或其字幕文件
     ai_confidence: Mapped[float | None] = mapped_column(Float, nullable=True)  # AI判断的置信度
     file_type: Mapped[str | None] = mapped_column(String, nullable=True)  # episode/subtitle/op/ed/sp/other
+    classified_by: Mapped[str | None] = mapped_column(String, nullable=True)  # 判断文件类型和剧集的方式：rule/learned_regex/ai_batch/ai/regex
     
     # 剧集信息
     extracted_episode: Mapped[int | None] = mapped_column(nullable=True)  # 提取的剧集（AI或正则）
@@ -92,4 +115,96 @@ class File(Base):
     processed_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)  # 处理完成时间
     
     # 关系
-    torrent: Mapped["Torrent"] = relationship("Torrent", back_populates="files")
\ No newline at end of file
+    torrent: Mapped["Torrent"] = relationship("Torrent", back_populates="files")
+
+class Job(Base):
+    # 同一个任务最多只有一个未完成的实例，并发添加时由数据库保证不重复
+    __table_args__ = (
+        Index(
+            "ix_job_active_dedupe", "kind", "dedupe_key",
+            unique=True,
+            sqlite_where=text("status IN ('pending', 'running')")
+        ),
+    )
+
+    kind: Mapped[str] = mapped_column(String)  # 任务类型，例如process_torrent
+    payload: Mapped[str] = mapped_column(Text)  # 任务参数（JSON）
+    dedupe_key: Mapped[str] = mapped_column(String, index=True)  # 用于避免重复添加相同的任务
+    status: Mapped[str] = mapped_column(String, index=True)  # pending/running/done/failed
+    attempts: Mapped[int] = mapped_column(default=0)  # 已执行次数
+    max_attempts: Mapped[int] = mapped_column(default=5)  # 最大执行次数
+    available_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)  # 可以执行的时间（用于退避重试）
+    lease_until: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)  # 租约到期时间
+    worker: Mapped[str | None] = mapped_column(String, nullable=True)  # 领取任务的worker
+    last_error: Mapped[str | None] = mapped_column(Text, nullable=True)  # 最后一次错误信息
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    finished_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+
+class SchedulerLease(Base):
+    name: Mapped[str] = mapped_column(String, unique=True, index=True)  # 租约名称
+    owner: Mapped[str | None] = mapped_column(String, nullable=True)  # 持有租约的进程
+    expires_at: Mapped[datetime] = mapped_column(DateTime)  # 租约到期时间
+    renewed_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)  # 最后续期时间
+
+class SeenItem(Base):
+    __table_args__ = (UniqueConstraint("source_id", "key"),)
+
+    source_id: Mapped[int] = mapped_column(
+        ForeignKey("source.id", ondelete="CASCADE"),  # 当Source被删除时，删除关联的记录
+        index=True
+    )
+    key: Mapped[str] = mapped_column(String)  # 条目的GUID（没有时为链接）或种子哈希（小写）
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+    # 关系
+    source: Mapped["Source"] = relationship("Source", back_populates="seen_items")
+
+class TorrentCache(Base):
+    url: Mapped[str] = mapped_column(String, unique=True, index=True)  # 种子文件链接
+    info_hash: Mapped[str] = mapped_column(String)  # 种子哈希（小写）
+    magnet: Mapped[str] = mapped_column(Text)  # 根据种子文件生成的磁力链接
+    name: Mapped[str | None] = mapped_column(String, nullable=True)  # 种子名称
+    files: Mapped[str | None] = mapped_column(Text, nullable=True)  # 文件列表（JSON）
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+class LLMCache(Base):
+    key: Mapped[str] = mapped_column(String, unique=True, index=True)  # 方法、模型、提示词版本和输入的哈希
+    method: Mapped[str] = mapped_column(String, index=True)  # 缓存的方法名
+    value: Mapped[str] = mapped_column(Text)  # 方法的返回值（JSON）
+    hit_count: Mapped[int] = mapped_column(default=0)  # 命中次数
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    expires_at: Mapped[datetime] = mapped_column(DateTime, index=True)  # 过期时间
+    last_used_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)  # 最近使用时间，超出容量时优先淘汰最久未使用的记录
+
+class FeedStat(Base):
+    source_id: Mapped[int] = mapped_column(
+        ForeignKey("source.id", ondelete="CASCADE"),
+        unique=True,
+        index=True
+    )
+    fetch_count: Mapped[int] = mapped_column(default=0)  # 抓取次数
+    error_count: Mapped[int] = mapped_column(default=0)  # 失败次数
+    not_modified_count: Mapped[int] = mapped_column(default=0)  # 内容未变化次数
+    last_status: Mapped[int | None] = mapped_column(nullable=True)  # 最近一次HTTP状态码
+    last_latency_ms: Mapped[float | None] = mapped_column(Float, nullable=True)  # 最近一次抓取耗时
+    total_latency_ms: Mapped[float] = mapped_column(Float, default=0.0)  # 抓取总耗时，用于计算平均值
+    latency_histogram: Mapped[str | None] = mapped_column(Text, nullable=True)  # 抓取耗时分布（JSON列表）
+    last_bytes: Mapped[int | None] = mapped_column(nullable=True)  # 最近一次内容大小
+    total_bytes: Mapped[int] = mapped_column(default=0)  # 累计下载大小
+    last_item_count: Mapped[int | None] = mapped_column(nullable=True)  # 最近一次解析出的条目数
+    last_new_count: Mapped[int | None] = mapped_column(nullable=True)  # 最近一次新添加的种子数
+    total_new_count: Mapped[int] = mapped_column(default=0)  # 累计新添加的种子数
+    last_parse_ms: Mapped[float | None] = mapped_column(Float, nullable=True)  # 最近一次解析耗时
+    parse_histogram: Mapped[str | None] = mapped_column(Text, nullable=True)  # 解析耗时分布（JSON列表）
+    last_error: Mapped[str | None] = mapped_column(Text, nullable=True)  # 最近一次错误信息
+    last_error_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    last_fetch_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+
+    # 关系
+    source: Mapped["Source"] = relationship("Source", back_populates="feed_stat")
+
+class ClassifyStat(Base):
+    classified_by: Mapped[str] = mapped_column(String, unique=True)  # 判断文件类型的方式：rule/learned_regex/ai_batch/ai
+    file_count: Mapped[int] = mapped_column(default=0)  # 累计判断的文件数，包括不保存到数据库的非正片文件
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
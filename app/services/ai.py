@@ -1,11 +1,48 @@
-from typing import Optional, Dict, Tuple, List
-import aiohttp
+from typing import Any, Optional, Dict, Tuple, List
 import json
 import asyncio
+import random
+import time
+import aiohttp
 from app.core.config import settings
+from app.services.http import http_sessions
+from app.services.llm_cache import llm_cache
+from app.services.rate_limit import TokenBucket, backoff_delay, parse_retry_after
 from duckduckgo_search import DDGS
 import logging
 
+class LLMMetrics:
+    """LLM请求的排队和限流统计"""
+    def __init__(self):
+        self.queued = 0  # 正在等待并发名额或限速的请求数
+        self.max_queued = 0
+        self.in_flight = 0  # 正在进行的请求数
+        self.requests = 0  # 发出的HTTP请求数（包括重试）
+        self.retries = 0
+        self.throttled = 0  # 收到429的次数
+        self.failures = 0  # 重试后仍然失败的调用数
+        self.total_wait = 0.0  # 排队和限速的总等待时间（秒）
+        self.total_tokens = 0  # 服务返回的token用量
+
+    def dict(self) -> Dict[str, Any]:
+        return {
+            "queued": self.queued,
+            "max_queued": self.max_queued,
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "retries": self.retries,
+            "throttled": self.throttled,
+            "failures": self.failures,
+            "avg_wait": self.total_wait / self.requests if self.requests else None,
+            "total_tokens": self.total_tokens,
+        }
+
+class LLMRetryableError(Exception):
+    """可以重试的错误，retry_after为服务要求的等待时间"""
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
 class AIClient:
     def __init__(self):
         self.url = settings.llm.url
@@ -14,74 +51,183 @@ class AIClient:
             "Authorization": f"Bearer {self.token}",
             "Content-Type": "application/json"
         }
-        self.max_retries = 3
-        self.retry_delay = 1  # 秒
+        self.max_retries = settings.llm.max_retries
         # Configure proxy for DuckDuckGo requests
         self.proxy = settings.general.http_proxy[0] if settings.general.http_proxy else None
+        # 并发和限速
+        self._semaphore = asyncio.Semaphore(settings.llm.max_concurrency)
+        self._request_bucket = TokenBucket(settings.llm.requests_per_minute)
+        self._token_bucket = TokenBucket(settings.llm.tokens_per_minute)
+        # 收到429后所有请求暂停到这个时间（time.monotonic）
+        self._paused_until = 0.0
+        self.metrics = LLMMetrics()
+
+    def _estimate_tokens(self, prompt: str) -> int:
+        """粗略估算请求消耗的token数（中文约1字1个token，英文约4字符1个token），加上回复的预留"""
+        ascii_chars = sum(1 for char in prompt if ord(char) < 128)
+        return ascii_chars // 4 + (len(prompt) - ascii_chars) + 256
+
+    async def _acquire(self, estimated_tokens: int):
+        """等待全局暂停、请求数和token数限速"""
+        started = time.monotonic()
+        self.metrics.queued += 1
+        self.metrics.max_queued = max(self.metrics.max_queued, self.metrics.queued)
+        try:
+            pause = self._paused_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+            await self._request_bucket.acquire(1)
+            await self._token_bucket.acquire(estimated_tokens)
+            await self._semaphore.acquire()
+        finally:
+            self.metrics.queued -= 1
+            self.metrics.total_wait += time.monotonic() - started
+
+    async def _post(self, prompt: str, estimated_tokens: int) -> str:
+        """发送一次请求，可以重试的错误抛出LLMRetryableError"""
+        await self._acquire(estimated_tokens)
+        self.metrics.in_flight += 1
+        self.metrics.requests += 1
+        try:
+            async with http_sessions.get("llm").post(
+                settings.llm.url,
+                headers={
+                    "Authorization": f"Bearer {settings.llm.token}",
+                    "Content-Type": "application/json"
+                },
+                json={
+                    "model": settings.llm.model_name,
+                    "messages": [
+                        {"role": "system", "content": "你是一个专门用于分析动漫标题和剧集信息的AI助手。"},
+                        {"role": "user", "content": prompt}
+                    ],
+                    "temperature": 0.1
+                }
+            ) as response:
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                if response.status == 429:
+                    self.metrics.throttled += 1
+                    raise LLMRetryableError("API返回状态码: 429", retry_after)
+                if response.status >= 500:
+                    raise LLMRetryableError(f"API返回状态码: {response.status}", retry_after)
+                if response.status != 200:
+                    raise Exception(f"API返回状态码: {response.status}")
+                data = await response.json()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise LLMRetryableError(str(e) or type(e).__name__)
+        finally:
+            self.metrics.in_flight -= 1
+            self._semaphore.release()
+
+        usage = data.get("usage") or {}
+        if isinstance(usage.get("total_tokens"), int):
+            self.metrics.total_tokens += usage["total_tokens"]
+            # 按实际用量修正token限速的额度
+            self._token_bucket.consume(usage["total_tokens"] - estimated_tokens)
+        return data["choices"][0]["message"]["content"]
 
     async def _make_request(self, prompt: str, max_retries: int = None) -> Optional[str]:
-        """发送请求到AI服务"""
+        """发送请求到AI服务，限流和服务端错误按指数退避重试，优先使用服务返回的Retry-After"""
         if not settings.llm.enable:
             return None
             
         retries = max_retries or self.max_retries
-        last_error = None
+        estimated_tokens = self._estimate_tokens(prompt)
         
         for attempt in range(retries):
             try:
-                async with aiohttp.ClientSession() as session:
-                    async with session.post(
-                        settings.llm.url,
-                        headers={
-                            "Authorization": f"Bearer {settings.llm.token}",
-                            "Content-Type": "application/json"
-                        },
-                        json={
-                            "model": settings.llm.model_name,
-                            "messages": [
-                                {"role": "system", "content": "你是一个专门用于分析动漫标题和剧集信息的AI助手。"},
-                                {"role": "user", "content": prompt}
-                            ],
-                            "temperature": 0.1
-                        }
-                    ) as response:
-                        if response.status != 200:
-                            raise Exception(f"API返回状态码: {response.status}")
-                        data = await response.json()
-                        return data["choices"][0]["message"]["content"]
+                return await self._post(prompt, estimated_tokens)
+            except LLMRetryableError as e:
+                if attempt == retries - 1:
+                    logging.warning(f"AI请求失败: {str(e)}")
+                    break
+                delay = backoff_delay(attempt, settings.llm.retry_base, settings.llm.retry_max)
+                if e.retry_after is not None:
+                    # 服务要求的等待时间适用于所有请求
+                    delay = e.retry_after + random.uniform(0, 1)
+                    self._paused_until = max(self._paused_until, time.monotonic() + delay)
+                logging.info(f"AI请求失败（{str(e)}），{delay:.1f} 秒后重试")
+                self.metrics.retries += 1
+                await asyncio.sleep(delay)
             except Exception as e:
-                last_error = e
-                if attempt < retries - 1:
-                    await asyncio.sleep(self.retry_delay * (attempt + 1))
-                continue
+                logging.warning(f"AI请求失败: {str(e)}")
+                break
         
+        self.metrics.failures += 1
         return None
 
+    def get_metrics(self) -> Dict[str, Any]:
+        """获取LLM请求的排队和限流统计"""
+        return dict(
+            self.metrics.dict(),
+            max_concurrency=settings.llm.max_concurrency,
+            requests_per_minute=settings.llm.requests_per_minute,
+            tokens_per_minute=settings.llm.tokens_per_minute,
+        )
+
+    def _search_keyword(self, keyword: str) -> List[Dict[str, str]]:
+        """同步搜索一个关键词，在线程池中运行"""
+        # 对每个关键词进行搜索，限制在动漫相关网站
+        query = f"{keyword} 动漫"
+        logging.info(f"Searching for: {query}")
+        with DDGS(
+            proxies={"http": self.proxy, "https": self.proxy} if self.proxy else None,
+            timeout=settings.llm.search_timeout
+        ) as ddgs:
+            results = list(ddgs.text(query, max_results=3))
+        return [
+            {
+                "title": r["title"],
+                "description": r["body"]
+            }
+            for r in results
+        ]
+
+    async def _search_cached(self, keyword: str) -> List[Dict[str, str]]:
+        """搜索一个关键词，结果按规范化后的关键词缓存"""
+        if settings.llm.cache_enable:
+            try:
+                hit, value = await llm_cache.get("ddg_search", keyword, per_model=False)
+                if hit:
+                    return value
+            except Exception as e:
+                logging.warning(f"读取搜索缓存失败: {str(e)}")
+
+        # DDGS是同步客户端，放到线程池中运行，避免阻塞事件循环
+        try:
+            results = await asyncio.wait_for(
+                asyncio.to_thread(self._search_keyword, keyword),
+                timeout=settings.llm.search_timeout
+            )
+        except asyncio.TimeoutError:
+            logging.warning(f"搜索 {keyword} 超时")
+            return []
+        except Exception as e:
+            logging.warning(f"搜索 {keyword} 失败: {str(e)}")
+            return []
+
+        # 没有结果可能是临时被限制，不缓存
+        if results and settings.llm.cache_enable:
+            try:
+                await llm_cache.put(
+                    "ddg_search", keyword, results, ttl=settings.llm.search_cache_ttl, per_model=False
+                )
+            except Exception as e:
+                logging.warning(f"写入搜索缓存失败: {str(e)}")
+        return results
+
     async def _search_anime_info(self, keywords: List[str]) -> List[Dict[str, str]]:
         """使用DuckDuckGo搜索多个关键词的动漫信息"""
         all_results = []
-        with DDGS(proxies={"http": self.proxy, "https": self.proxy} if self.proxy else None) as ddgs:
-            for keyword in keywords:
-                try:
-                    # 对每个关键词进行搜索，限制在动漫相关网站
-                    query = f"{keyword} 动漫"
-                    logging.info(f"Searching for: {query}")
-                    results = list(ddgs.text(query, max_results=3))
-                    if results:
-                        all_results.append({
-                            "keyword": keyword,
-                            "search_results": [
-                                {
-                                    "title": r["title"],
-                                    "description": r["body"]
-                                }
-                                for r in results
-                            ]
-                        })
-                except Exception:
-                    continue
+        for keyword, results in zip(keywords, await asyncio.gather(*(self._search_cached(k) for k in keywords))):
+            if results:
+                all_results.append({
+                    "keyword": keyword,
+                    "search_results": results
+                })
         return all_results
 
+    @llm_cache.cached("extract_name")
     async def extract_name(self, title: str) -> Optional[str]:
         """从标题中提取动漫名称"""
         # 对每个关键词进行搜索
@@ -129,6 +275,7 @@ class AIClient:
             return name
         return None
 
+    @llm_cache.cached("extract_season")
     async def extract_season(self, title: str) -> Optional[int]:
         """从标题中提取季度信息"""
         prompt = f"""请从这个标题中提取动漫的季度数字（如果有）。
@@ -153,6 +300,7 @@ class AIClient:
                 continue
         return None
 
+    @llm_cache.cached("extract_episode")
     async def extract_episode(self, title: str) -> Optional[int]:
         """从标题中提取集数信息"""
         prompt = f"""
@@ -185,6 +333,7 @@ class AIClient:
                 continue
         return None
 
+    @llm_cache.cached("extract_media_type")
     async def extract_media_type(self, title: str) -> Optional[str]:
         """判断是电影还是剧集"""
         prompt = f"""请判断这个动漫标题是电影还是剧集。
@@ -257,7 +406,141 @@ class AIClient:
                 "episode": None
             }
 
-    async def is_main_content(self, file_path: str) -> bool:
+    # 批量分类的文件类型，episode和subtitle为正片内容
+    FILE_TYPES = ("episode", "subtitle", "op", "ed", "sp", "other")
+    # 批量分类的提示词版本，修改提示词后需要增加，使缓存失效
+    CLASSIFY_VERSION = 1
+    # 每次请求中文件路径的总长度上限
+    CLASSIFY_MAX_CHARS = 6000
+
+    def _chunk_files(self, file_paths: List[str]) -> List[List[str]]:
+        """按数量和总长度将文件列表分批"""
+        chunks: List[List[str]] = []
+        chunk: List[str] = []
+        size = 0
+        for path in file_paths:
+            if chunk and (len(chunk) >= settings.llm.batch_size or size + len(path) > self.CLASSIFY_MAX_CHARS):
+                chunks.append(chunk)
+                chunk, size = [], 0
+            chunk.append(path)
+            size += len(path)
+        if chunk:
+            chunks.append(chunk)
+        return chunks
+
+    def _parse_classification(self, item: Dict) -> Optional[Dict]:
+        """校验模型返回的单个文件分类结果"""
+        file_type = str(item.get("file_type", "")).strip().lower()
+        if file_type not in self.FILE_TYPES:
+            return None
+        episode = item.get("episode")
+        try:
+            episode = int(episode) if episode is not None else None
+        except (TypeError, ValueError):
+            episode = None
+        if episode is not None and not 0 < episode < 1000:
+            episode = None
+        try:
+            confidence = min(max(float(item.get("confidence", 0.5)), 0.0), 1.0)
+        except (TypeError, ValueError):
+            confidence = 0.5
+        return {
+            "is_main": bool(item.get("is_main", file_type in ("episode", "subtitle"))),
+            "file_type": file_type,
+            "episode": episode,
+            "confidence": confidence,
+        }
+
+    async def _classify_chunk(self, file_paths: List[str]) -> Dict[str, Dict]:
+        """在一次请求中分类一批文件"""
+        listing = "\n".join(f"{index}. {path}" for index, path in enumerate(file_paths))
+        prompt = f"""下面是一个动漫种子中的文件列表（包含目录），每行的开头是文件的编号。
+
+<files>
+{listing}
+</files>
+
+请判断每个文件的类型，并提取正片的集数：
+- file_type: "episode"（正片视频）、"subtitle"（正片的字幕）、"op"（片头）、"ed"（片尾）、"sp"（特典、番外、OVA）、"other"（预告片、采访、花絮、样本、截图、nfo等其他文件）
+- is_main: 是否为需要保留的正片视频或正片字幕，只有episode和subtitle为true
+- episode: 正片的集数（整数），不是正片或找不到集数时为null
+- confidence: 判断的置信度，0到1之间的小数
+
+判断标准：
+1. 视频格式（.mkv, .mp4, .avi, .ts等）且文件名不包含"sample", "trailer", "preview"等词的通常是正片
+2. 字幕格式（.ass, .srt, .ssa等）且文件名与正片视频相似的是正片字幕
+3. 路径中包含"Samples", "Trailers", "Extras", "SP", "CDs", "Scans"等文件夹的通常不是正片
+4. 特典番外不算正片
+
+将结果以JSON数组放在<result>标签中返回，每个文件一项，例如：
+<result>[{{"index": 0, "file_type": "episode", "is_main": true, "episode": 1, "confidence": 0.95}}]</result>"""
+
+        response = await self._make_request(prompt)
+        if not response:
+            return {}
+        import re
+        match = re.search(r"<result>(.*?)</result>", response, re.DOTALL)
+        text = match.group(1) if match else response
+        start, end = text.find("["), text.rfind("]")
+        if start < 0 or end < start:
+            return {}
+        try:
+            items = json.loads(text[start:end + 1])
+        except ValueError:
+            logging.warning("AI批量分类返回的结果不是有效的JSON")
+            return {}
+
+        results: Dict[str, Dict] = {}
+        for item in items if isinstance(items, list) else []:
+            if not isinstance(item, dict):
+                continue
+            index = item.get("index")
+            if not isinstance(index, int) or not 0 <= index < len(file_paths):
+                continue
+            classification = self._parse_classification(item)
+            if classification:
+                results[file_paths[index]] = classification
+        return results
+
+    async def classify_files(self, file_paths: List[str]) -> Dict[str, Dict]:
+        """
+        批量判断文件类型并提取集数，文件较多时自动分批请求
+
+        Args:
+            file_paths: 文件路径列表（相对于种子根目录）
+
+        Returns:
+            {路径: {"is_main", "file_type", "episode", "confidence"}}，分类失败的文件不在结果中
+        """
+        results: Dict[str, Dict] = {}
+        pending: List[str] = []
+        for path in dict.fromkeys(file_paths):
+            if settings.llm.cache_enable:
+                try:
+                    hit, value = await llm_cache.get("classify_file", path, self.CLASSIFY_VERSION)
+                    if hit:
+                        results[path] = value
+                        continue
+                except Exception as e:
+                    logging.warning(f"读取AI缓存失败: {str(e)}")
+            pending.append(path)
+        if not pending:
+            return results
+
+        chunks = self._chunk_files(pending)
+        logging.info(f"AI批量分类 {len(pending)} 个文件，共 {len(chunks)} 次请求")
+        for classified in await asyncio.gather(*(self._classify_chunk(chunk) for chunk in chunks)):
+            for path, value in classified.items():
+                results[path] = value
+                if settings.llm.cache_enable:
+                    try:
+                        await llm_cache.put("classify_file", path, value, self.CLASSIFY_VERSION)
+                    except Exception as e:
+                        logging.warning(f"写入AI缓存失败: {str(e)}")
+        return results
+
+    @llm_cache.cached("is_main_content")
+    async def is_main_content(self, file_path: str) -> Optional[bool]:
         """
         判断文件是否为需要保留的正片或字幕文件
         
@@ -265,7 +548,7 @@ class AIClient:
             file_path: 文件的完整路径
             
         Returns:
-            True如果是正片或正片字幕文件，否则False
+            True如果是正片或正片字幕文件，否则False，请求失败时返回None（不缓存）
         """
         prompt = f"""请分析这个文件路径，判断它是否是动漫的正片视频或者正片的字幕文件。
         
@@ -286,14 +569,17 @@ class AIClient:
 
 请只回答"yes"或"no"，将判断的结果放到<result>标签中返回：<result>yes</result> 或 <result>no</result>"""
         response = await self._make_request(prompt)
+        if not response:
+            return None
         import re
         match = re.search(r"<result>(.*?)</result>", response, re.DOTALL)
         if not match:
-            return False
+            return None
         if match.group(1).strip() == "yes":
             return True
         return False
 
+    @llm_cache.cached("generate_episode_regex")
     async def generate_episode_regex(self, title: str) -> Optional[str]:
         """从标题中提取可用于识别集数的正则表达式模式"""
         prompt = f"""分析下面这个动漫标题，为其生成一个用于提取集数的正则表达式。
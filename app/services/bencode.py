@@ -0,0 +1,202 @@
+"""种子文件（bencode）扫描器
+
+只扫描原始字节确定各个值的位置，不解码整个种子文件：
+- info_hash直接对原始数据中info字典所在的字节区间计算，不需要重新编码
+- name、文件列表等字段按需解码，pieces等大字段只跳过不复制
+"""
+from typing import Any, Dict, List, Optional, Tuple
+import hashlib
+
+def _skip(buf: bytes, pos: int) -> int:
+    """跳过从pos开始的一个值，返回其结束位置（非递归，字符串直接按长度跳过）"""
+    depth = 0
+    try:
+        while True:
+            lead = buf[pos]
+            if lead == 0x69:  # i
+                pos = buf.index(b"e", pos + 1) + 1
+            elif lead == 0x6C or lead == 0x64:  # l/d
+                depth += 1
+                pos += 1
+                continue
+            elif lead == 0x65 and depth > 0:  # e
+                depth -= 1
+                pos += 1
+            elif 0x30 <= lead <= 0x39:  # 字符串长度
+                pos = _string_span(buf, pos)[1]
+            else:
+                raise ValueError(f"无效的bencode数据（位置 {pos}）")
+            if depth == 0:
+                return pos
+    except IndexError:
+        raise ValueError("种子文件不完整")
+
+def _string_span(buf: bytes, pos: int) -> Tuple[int, int]:
+    """字符串内容所在的区间"""
+    colon = buf.index(b":", pos)
+    start = colon + 1
+    end = start + int(buf[pos:colon])
+    if not start <= end <= len(buf):
+        raise ValueError("种子文件不完整")
+    return start, end
+
+def scan_dict(buf: bytes, pos: int) -> Tuple[Dict[bytes, Tuple[int, int]], int]:
+    """扫描从pos开始的字典，返回 ({键: (值起始位置, 值结束位置)}, 字典结束位置)，值不解码"""
+    if buf[pos:pos + 1] != b"d":
+        raise ValueError(f"无效的bencode字典（位置 {pos}）")
+    spans: Dict[bytes, Tuple[int, int]] = {}
+    pos += 1
+    while buf[pos:pos + 1] != b"e":
+        if not buf[pos:pos + 1]:
+            raise ValueError("种子文件不完整")
+        key_start, key_end = _string_span(buf, pos)
+        pos = _skip(buf, key_end)
+        spans[buf[key_start:key_end]] = (key_end, pos)
+    return spans, pos + 1
+
+def decode(buf: bytes, pos: int = 0) -> Any:
+    """解码从pos开始的一个值"""
+    value, _ = _decode(buf, pos)
+    return value
+
+def _decode(buf: bytes, pos: int) -> Tuple[Any, int]:
+    """解码从pos开始的一个值，返回 (值, 结束位置)"""
+    lead = buf[pos:pos + 1]
+    if lead == b"i":
+        end = buf.index(b"e", pos + 1)
+        return int(buf[pos + 1:end]), end + 1
+    if lead == b"l":
+        values = []
+        pos += 1
+        while buf[pos:pos + 1] != b"e":
+            if not buf[pos:pos + 1]:
+                raise ValueError("种子文件不完整")
+            value, pos = _decode(buf, pos)
+            values.append(value)
+        return values, pos + 1
+    if lead == b"d":
+        result = {}
+        pos += 1
+        while buf[pos:pos + 1] != b"e":
+            if not buf[pos:pos + 1]:
+                raise ValueError("种子文件不完整")
+            key_start, key_end = _string_span(buf, pos)
+            result[buf[key_start:key_end]], pos = _decode(buf, key_end)
+        return result, pos + 1
+    start, end = _string_span(buf, pos)
+    return buf[start:end], end
+
+def _text(value: bytes) -> str:
+    return value.decode("utf-8", errors="ignore")
+
+def _walk_file_tree(tree: Dict[bytes, Any], prefix: List[str], files: List[Dict[str, Any]]):
+    """遍历v2种子的file tree，叶子节点的键为空字符串"""
+    for name, node in tree.items():
+        if name == b"" and isinstance(node, dict):
+            files.append({"path": "/".join(prefix), "size": node.get(b"length", 0)})
+        elif isinstance(node, dict):
+            _walk_file_tree(node, prefix + [_text(name)], files)
+
+class TorrentMeta:
+    """种子文件的元信息，info_hash在创建时计算，其他字段在访问时解码"""
+    def __init__(self, data: bytes):
+        self._data = data
+        self._top: Dict[bytes, Tuple[int, int]] = {}
+        self._info: Dict[bytes, Tuple[int, int]] = {}
+        if data[:1] != b"d":
+            raise ValueError("无效的种子文件")
+        # 扫描顶层字典，info字典在扫描的同时记录其中各字段的位置，只遍历一次
+        pos = 1
+        while data[pos:pos + 1] != b"e":
+            if not data[pos:pos + 1]:
+                raise ValueError("种子文件不完整")
+            key_start, key_end = _string_span(data, pos)
+            key = data[key_start:key_end]
+            if key == b"info":
+                self._info, pos = scan_dict(data, key_end)
+            else:
+                pos = _skip(data, key_end)
+            self._top[key] = (key_end, pos)
+        if b"info" not in self._top:
+            raise ValueError("种子文件缺少info字段")
+        start, end = self._top[b"info"]
+
+        # 直接对原始字节计算哈希，不复制数据
+        info_bytes = memoryview(data)[start:end]
+        meta_version = self._info_value(b"meta version")
+        # 只有v2字段的种子没有pieces
+        self.has_v1 = b"pieces" in self._info
+        self.has_v2 = meta_version == 2
+        self.info_hash_v1: Optional[str] = hashlib.sha1(info_bytes).hexdigest() if self.has_v1 else None
+        self.info_hash_v2: Optional[str] = hashlib.sha256(info_bytes).hexdigest() if self.has_v2 else None
+
+    @property
+    def info_hash(self) -> str:
+        """种子的ID，与qBittorrent一致：有v1哈希时使用v1哈希，纯v2种子使用截断的v2哈希"""
+        if self.info_hash_v1:
+            return self.info_hash_v1
+        if self.info_hash_v2:
+            return self.info_hash_v2[:40]
+        raise ValueError("种子文件既没有v1也没有v2信息")
+
+    def _top_value(self, key: bytes) -> Any:
+        span = self._top.get(key)
+        return decode(self._data, span[0]) if span else None
+
+    def _info_value(self, key: bytes) -> Any:
+        span = self._info.get(key)
+        return decode(self._data, span[0]) if span else None
+
+    @property
+    def name(self) -> Optional[str]:
+        value = self._info_value(b"name")
+        return _text(value) if isinstance(value, bytes) else None
+
+    @property
+    def files(self) -> List[Dict[str, Any]]:
+        """文件列表 [{"path", "size"}]"""
+        files: List[Dict[str, Any]] = []
+        file_list = self._info_value(b"files")
+        if isinstance(file_list, list):
+            for file in file_list:
+                # 混合种子中用于对齐的填充文件
+                if b"p" in file.get(b"attr", b""):
+                    continue
+                path = "/".join(_text(part) for part in file.get(b"path", []))
+                files.append({"path": path, "size": file.get(b"length", 0)})
+            return files
+        file_tree = self._info_value(b"file tree")
+        if isinstance(file_tree, dict):
+            _walk_file_tree(file_tree, [], files)
+            return files
+        name = self.name
+        if name is not None:
+            files.append({"path": name, "size": self._info_value(b"length") or 0})
+        return files
+
+    @property
+    def trackers(self) -> List[str]:
+        """announce和announce-list中的tracker"""
+        trackers = []
+        announce = self._top_value(b"announce")
+        if isinstance(announce, bytes):
+            trackers.append(_text(announce))
+        announce_list = self._top_value(b"announce-list")
+        if isinstance(announce_list, list):
+            for tier in announce_list:
+                if isinstance(tier, list):
+                    tier = tier[0] if tier else None
+                if isinstance(tier, bytes):
+                    trackers.append(_text(tier))
+        return trackers
+
+    @property
+    def nodes(self) -> List[Tuple[str, int]]:
+        """DHT节点"""
+        nodes = []
+        value = self._top_value(b"nodes")
+        if isinstance(value, list):
+            for node in value:
+                if isinstance(node, list) and len(node) >= 2:
+                    nodes.append((_text(node[0]), node[1]))
+        return nodes
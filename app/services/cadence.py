@@ -0,0 +1,113 @@
+from typing import List, Optional, Dict, Any
+from datetime import datetime, timedelta, timezone
+from statistics import median
+from app.core.config import settings
+from app.models.database import Source
+import json
+import logging
+
+class CadencePlanner:
+    """根据RSS条目的发布时间学习更新规律，决定RSS源的下次检查时间
+
+    - 在预计的更新时间附近频繁检查
+    - 错过预计更新时从check_interval开始退避
+    - 还没有学到规律时（例如条目没有发布时间）按check_interval检查
+    - 长时间没有新条目的源自动暂停
+    """
+    # 保留的发布时间数量
+    HISTORY_SIZE = 16
+
+    def _to_utc(self, value: datetime) -> datetime:
+        """统一转换为不带时区的UTC时间，与数据库中的时间保持一致"""
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
+
+    def _load_history(self, src: Source) -> List[datetime]:
+        """读取RSS源保存的发布时间历史"""
+        if not src.publish_history:
+            return []
+        try:
+            return [datetime.fromisoformat(value) for value in json.loads(src.publish_history)]
+        except (ValueError, TypeError):
+            return []
+
+    def learn_period(self, history: List[datetime]) -> Optional[int]:
+        """根据发布时间历史计算更新周期（秒），取相邻发布时间间隔的中位数"""
+        # 同一批发布（例如一次发布多个字幕版本）间隔很短，不计入周期
+        gaps = [
+            (later - earlier).total_seconds()
+            for earlier, later in zip(history, history[1:])
+            if (later - earlier).total_seconds() >= settings.scheduler.cadence_min_interval
+        ]
+        if not gaps:
+            return None
+        return int(median(gaps))
+
+    def plan(
+        self,
+        src: Source,
+        published: List[Optional[datetime]],
+        has_new_items: bool,
+        now: Optional[datetime] = None
+    ) -> Dict[str, Any]:
+        """计算本次检查后RSS源需要更新的字段（包括next_check_at）"""
+        now = now or datetime.utcnow()
+        config = settings.scheduler
+
+        history = self._load_history(src)
+        dates = sorted({self._to_utc(value) for value in published if value is not None} | set(history))
+        dates = [value for value in dates if value <= now][-self.HISTORY_SIZE:]
+
+        last_item_at = dates[-1] if dates else src.last_item_at
+        if has_new_items or (last_item_at and (not src.last_item_at or last_item_at > src.last_item_at)):
+            idle_checks = 0
+        else:
+            idle_checks = src.idle_checks + 1
+
+        updates: Dict[str, Any] = {
+            "publish_history": json.dumps([value.isoformat() for value in dates]),
+            "last_item_at": last_item_at,
+            "idle_checks": idle_checks,
+        }
+
+        # 长时间没有新条目，自动暂停；从添加源开始计算，新添加的源即使最新条目很旧也先观察一段时间
+        idle_since = max(value for value in (last_item_at, src.created_at) if value) if last_item_at else None
+        if idle_since and now - idle_since >= timedelta(weeks=config.cadence_pause_after_weeks):
+            logging.info(f"RSS源 {src.id} 已超过 {config.cadence_pause_after_weeks} 周没有新条目，自动暂停")
+            updates["is_paused"] = True
+            updates["next_check_at"] = None
+            return updates
+
+        min_interval = config.cadence_min_interval
+        max_interval = max(config.cadence_max_interval, src.check_interval)
+        # 没有学到更新周期时无法判断何时会更新，保持用户设置的间隔，避免每周更新的番剧延迟几天才被发现
+        next_check_at = now + timedelta(seconds=src.check_interval)
+
+        period = self.learn_period(dates)
+        if period and last_item_at:
+            window = timedelta(seconds=config.cadence_window)
+            # 找到下一个尚未结束的预计更新窗口，slot - 1 为已经错过的预计更新次数
+            slot = max(int((now - last_item_at - window).total_seconds() // period) + 1, 1)
+            expected = last_item_at + timedelta(seconds=period * slot)
+            if expected - window <= now and slot <= 2:
+                # 处于预计更新时间附近，频繁检查（允许错过一次，例如延期）
+                next_check_at = now + timedelta(seconds=min_interval)
+            elif slot == 1:
+                # 睡到预计更新窗口开始，但不超过最大间隔
+                next_check_at = min(expected - window, now + timedelta(seconds=max_interval))
+            else:
+                # 错过了预计更新（更新晚于窗口），从check_interval开始退避：
+                # 间隔取错过窗口以来的时间，检查越来越稀疏，但晚到的更新最多延迟这么久才被发现
+                missed_at = last_item_at + timedelta(seconds=period) + window
+                delay = min(max((now - missed_at).total_seconds(), src.check_interval), max_interval)
+                next_check_at = now + timedelta(seconds=delay)
+                if slot == 2:
+                    # 只错过一次时，下一个预计更新窗口开始时恢复频繁检查
+                    next_check_at = min(next_check_at, expected - window)
+
+        updates["next_check_at"] = next_check_at
+        return updates
+
+# 创建全局检查节奏规划器实例
+cadence_planner = CadencePlanner()
@@ -1,13 +1,18 @@
 from datetime import datetime
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, delete
+from sqlalchemy import select, update, delete, func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from app.db.session import async_session
 from app.models.database import Torrent
 from app.core.config import settings
 from app.services.qbittorrent import qbittorrent_client
 from typing import Optional, List, Dict, Any
+from collections import Counter
 from app.models.database import File
 from app.services.ai import ai_client
+from app.services.file_rules import file_rules
+from app.services.episode_regex import episode_regex_learner
+from app.services.job_queue import job_queue
 import os
 import logging
 import shutil
@@ -22,6 +27,7 @@ class DownloadManager:
             )
             return result.scalar_one_or_none() is not None
 
+
     async def create_download(
         self,
         source_id: int,
@@ -58,43 +64,150 @@ class DownloadManager:
 
             return torrent
 
-    async def update_torrent_status(self, db: AsyncSession, torrent_id: int, torrent_info: dict):
-        """更新种子状态"""
+    async def ingest_items(self, source_id: int, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """批量添加RSS条目的下载任务，返回实际新添加的条目
+
+        一次IN查询排除已有的种子，一条INSERT ... ON CONFLICT DO NOTHING写入所有新种子，
+        其他RSS源或并发的检查已经添加过的种子会被跳过而不是中断整批。
+        写入成功后一次请求添加到qBittorrent，添加失败时将这批种子标记为失败。
+        """
+        # 同一批中重复的种子只保留第一个
+        pending: Dict[str, Dict[str, Any]] = {}
+        for item in items:
+            if item.get("hash") and item.get("magnet"):
+                pending.setdefault(item["hash"].lower(), item)
+        if not pending:
+            return []
+
+        now = datetime.utcnow()
+        async with async_session() as db:
+            # 已有种子的哈希大小写可能与本次不同
+            candidates = {item["hash"] for item in pending.values()} | set(pending)
+            result = await db.execute(select(Torrent.hash).where(Torrent.hash.in_(candidates)))
+            for existing in result.scalars():
+                pending.pop(existing.lower(), None)
+            if not pending:
+                return []
+
+            result = await db.execute(
+                sqlite_insert(Torrent)
+                .values([
+                    {
+                        "hash": item["hash"],
+                        "source_id": source_id,
+                        "url": item["magnet"],
+                        "status": "downloading",
+                        "download_progress": 0.0,
+                        "created_at": now,
+                        "started_at": now,
+                    }
+                    for item in pending.values()
+                ])
+                .on_conflict_do_nothing(index_elements=["hash"])
+                .returning(Torrent.id, Torrent.hash)
+            )
+            inserted = {torrent_hash.lower(): torrent_id for torrent_id, torrent_hash in result.all()}
+            await db.commit()
+            if not inserted:
+                return []
+
+            added = [pending[torrent_hash] for torrent_hash in inserted]
+            logging.info(f"RSS源 {source_id} 新添加 {len(added)} 个种子")
+            error = await qbittorrent_client.add_torrents([item["magnet"] for item in added])
+            if error:
+                logging.error(f"添加种子到qBittorrent失败: {error}")
+                # 可能只有部分种子添加失败，只标记qBittorrent中不存在的种子
+                existing = await qbittorrent_client.get_torrents_info(list(inserted)) or {}
+                failed = [torrent_id for torrent_hash, torrent_id in inserted.items() if torrent_hash not in existing]
+                await db.execute(
+                    update(Torrent)
+                    .where(Torrent.id.in_(failed))
+                    .values(status="failed", error_message=error)
+                )
+                await db.commit()
+            return added
+
+    async def update_torrents_status(self, db: AsyncSession, torrents: List[Torrent], torrent_infos: Dict[str, Dict]):
+        """批量更新种子状态，所有状态变更在一个事务中提交
+
+        torrent_infos为 {小写hash: 状态字典}（不含文件列表），缺失或为None的种子视为获取失败，
+        新完成的种子在提交后加入任务队列，由worker获取文件列表并处理
+        """
+        completed_ids = []
+        for torrent in torrents:
+            torrent_info = torrent_infos.get(torrent.hash.lower())
+            if self._apply_torrent_info(torrent, torrent_info):
+                completed_ids.append(torrent.id)
+            db.add(torrent)
+        await db.commit()
+        logging.info(f"已更新 {len(torrents)} 个种子状态，其中 {len(completed_ids)} 个下载完成")
+
+        for torrent_id in completed_ids:
+            await job_queue.enqueue("process_torrent", {"torrent_id": torrent_id})
+
+    async def get_torrent_by_hash(self, db: AsyncSession, torrent_hash: str) -> Optional[Torrent]:
+        """通过Hash获取种子（忽略大小写）"""
         result = await db.execute(
-            select(Torrent).where(Torrent.id == torrent_id)
+            select(Torrent).where(func.lower(Torrent.hash) == torrent_hash.lower())
         )
-        logging.info(f"更新种子状态: {torrent_id} {torrent_info}")
-        torrent = result.scalar_one_or_none()
-        if not torrent:
-            return
+        return result.scalar_one_or_none()
+
+    async def complete_torrent(self, torrent_id: int):
+        """处理qBittorrent的下载完成回调：立即加入任务队列"""
+        await job_queue.enqueue("process_torrent", {"torrent_id": torrent_id})
+
+    async def process_completed_torrent(self, payload: Dict[str, Any]):
+        """任务队列处理函数：确认种子已下载完成，然后处理文件
+
+        无法连接qBittorrent时抛出异常，由任务队列退避重试
+        """
+        torrent_id = payload["torrent_id"]
+        async with async_session() as db:
+            result = await db.execute(
+                select(Torrent).where(Torrent.id == torrent_id)
+            )
+            torrent = result.scalar_one_or_none()
+            if not torrent:
+                logging.warning(f"种子 {torrent_id} 不存在，跳过处理")
+                return
+
+            torrent_info = await qbittorrent_client.get_torrent_info(torrent.hash)
+            if not torrent_info:
+                raise Exception(f"无法获取种子 {torrent.hash} 信息")
+
+            if torrent.status != "downloaded":
+                # 来自完成回调，状态还未被轮询更新
+                completed = self._apply_torrent_info(torrent, torrent_info)
+                db.add(torrent)
+                await db.commit()
+                if not completed:
+                    logging.info(f"种子 {torrent.hash} 尚未下载完成，状态: {torrent_info['state']}")
+                    return
 
+            # 硬链接文件到指定目录，同时更新File表
+            await self.update_torrent_files(db, torrent.id, torrent_info)
+
+    def _apply_torrent_info(self, torrent: Torrent, torrent_info: Optional[Dict]) -> bool:
+        """根据qBittorrent状态更新种子记录（不提交），返回种子是否刚刚下载完成"""
         if not torrent_info:
             torrent.status = "failed"
             torrent.error_message = "无法获取种子信息"
-            db.add(torrent)
-            await db.commit()
-            return
+            return False
         # 更新状态
         torrent.download_progress = torrent_info["progress"] * 100
         if torrent_info["state"] in ["uploading", "stalledUP", "forcedUP", "queuedUP", "pausedUP"]:
             if torrent.status != "downloaded":
                 torrent.status = "downloaded"
                 torrent.completed_at = datetime.utcnow()
-                db.add(torrent)
-                await db.commit()
-
-                # 硬链接文件到指定目录，同时更新File表
-                await self.update_torrent_files(db, torrent.id, torrent_info)
+                return True
+        elif torrent_info["state"] in ["error", "missingFiles"]:
+            torrent.status = "failed"
+            torrent.error_message = f"qBittorrent状态: {torrent_info['state']}"
         else:
-            if torrent_info["state"] in ["error", "missingFiles"]:
-                torrent.status = "failed"
-                torrent.error_message = f"qBittorrent状态: {torrent_info['state']}"
-            else:
-                # Downloading
-                torrent.status = "downloading"
-                torrent.error_message = None
-            db.add(torrent)
-            await db.commit()
+            # Downloading
+            torrent.status = "downloading"
+            torrent.error_message = None
+        return False
     
     async def get_torrent_files(self, db: AsyncSession, torrent_id: int) -> List[Dict[str, Any]]:
         """获取种子的文件列表"""
@@ -125,7 +238,7 @@ class DownloadManager:
             logging.warning(f"种子 {torrent_id} 不存在")
             return
 
-        if not torrent_info:
+        if not torrent_info or "files" not in torrent_info:
             torrent_info = await qbittorrent_client.get_torrent_info(torrent.hash)
         if not torrent_info:
             logging.warning(f"种子 {torrent.hash} 信息获取失败")
@@ -184,6 +297,51 @@ class DownloadManager:
         
         # 获取种子名称用于路径处理
         torrent_name = torrent_info.get("name", "")
+
+        # 使用AI时先用规则判断明显的文件，剩下的文件一次请求分类，文件较多时自动分批
+        classifications = {}
+        if source.use_ai_episode:
+            classifications = file_rules.classify_files(files)
+            for classification in classifications.values():
+                classification["classified_by"] = "rule"
+            pending = [
+                file_info.get("name", "") for file_info in files
+                if file_info.get("name") and file_info.get("name") not in classifications
+            ]
+            # 来源已有验证过的剧集正则表达式时，匹配的视频和字幕文件不再请求AI
+            for path in list(pending):
+                file_type = file_rules.main_file_type(path)
+                episode = episode_regex_learner.extract(source, path) if file_type else None
+                if episode is not None:
+                    classifications[path] = {
+                        "is_main": True,
+                        "file_type": file_type,
+                        "episode": episode,
+                        "confidence": 1.0,
+                        "classified_by": "learned_regex",
+                    }
+                    pending.remove(path)
+            logging.info(f"种子 {torrent.hash} 共 {len(files)} 个文件，规则和正则表达式判断 {len(classifications)} 个，AI判断 {len(pending)} 个")
+            if pending:
+                answers = {}
+                for path, classification in (await ai_client.classify_files(pending)).items():
+                    classifications[path] = dict(classification, classified_by="ai_batch")
+                    if classification["is_main"] and classification["episode"] is not None:
+                        answers[path] = classification["episode"]
+                # 用AI的结果验证或重新生成来源的剧集正则表达式
+                if answers:
+                    await episode_regex_learner.learn(source, answers)
+                    db.add(source)
+                    # 立即提交，种子没有正片文件或之后提前结束时学习结果和失败次数也不会丢失
+                    await db.commit()
+
+            # 统计所有文件（包括之后跳过的非正片文件）的判断方式，批量分类中缺少的文件之后单独请求AI
+            counts = Counter(classification["classified_by"] for classification in classifications.values())
+            counts["ai"] += sum(1 for path in pending if path not in classifications)
+            try:
+                await file_rules.record(counts)
+            except Exception as e:
+                logging.warning(f"记录文件判断方式的统计失败: {str(e)}")
         
         for file_info in files:
             logging.info(f"处理文件: {file_info}")
@@ -197,18 +355,30 @@ class DownloadManager:
             full_path = os.path.join(download_dir, file_path)
             logging.info(f"处理文件: {full_path}")
             
+            file_type = None
+            ai_confidence = None
             if source.use_ai_episode:
                 # 使用AI提取剧集信息
-                
-                # 使用AI判断这个文件是否为需要保留的正片文件
-                is_main_content = await ai_client.is_main_content(file_path)
+                classification = classifications.get(file_path)
+                if classification:
+                    is_main_content = classification["is_main"]
+                    file_type = classification["file_type"]
+                    ai_confidence = classification["confidence"]
+                    classified_by = classification["classified_by"]
+                else:
+                    # 批量分类中缺少的文件单独判断
+                    is_main_content = await ai_client.is_main_content(file_path)
+                    classified_by = "ai"
                 logging.info(f"文件 {file_path} 是否为主要内容: {is_main_content}")
 
                 if not is_main_content:
                     logging.info(f"文件 {file_path} 不是主要内容，跳过")
                     continue
 
-                episode_value = await ai_client.extract_episode(file_path)
+                episode_value = classification["episode"] if classification else None
+                if episode_value is None:
+                    episode_value = await ai_client.extract_episode(file_path)
+                    classified_by = "ai"
                 if not episode_value:
                     logging.warning(f"文件 {file_path} 未提取到剧集信息")
                     continue
@@ -216,6 +386,7 @@ class DownloadManager:
                 # 使用正则表达式提取
                 regex = source.episode_regex
                 episode_value = None
+                classified_by = "regex"
 
                 import re
                 match = re.search(regex, file_path)
@@ -235,6 +406,9 @@ class DownloadManager:
                 size = file_size,
                 path = full_path,
                 is_valid_episode = episode_value is not None,
+                file_type = file_type,
+                ai_confidence = ai_confidence,
+                classified_by = classified_by,
                 extracted_episode = episode_value,
                 final_episode = (episode_value + source.episode_offset) if episode_value is not None else None
             )
@@ -454,4 +628,7 @@ class DownloadManager:
             logging.error(f"创建硬链接失败: {str(e)}")
             return f"创建硬链接失败: {str(e)}"
 
-download_manager = DownloadManager()
\ No newline at end of file
+download_manager = DownloadManager()
+
+# 注册下载完成后的处理任务
+job_queue.register("process_torrent", download_manager.process_completed_torrent)
\ No newline at end of file
@@ -0,0 +1,119 @@
+from typing import Dict, Optional
+from datetime import datetime, timedelta
+from app.models.database import Source
+from app.services.ai import ai_client
+import logging
+import re
+
+class EpisodeRegexLearner:
+    """为使用AI提取剧集的来源学习剧集正则表达式
+
+    同一个来源的文件名通常使用相同的模板。第一次由AI生成正则表达式，
+    与AI对之后几个文件的判断结果一致后保存到来源上，之后直接用正则表达式提取剧集；
+    正则表达式不再匹配时丢弃，由AI判断并重新生成。
+    连续失败多次后暂停生成，避免每个文件都多请求一次AI，过了重试间隔后重新尝试。
+    """
+    # 与AI结果一致多少次后直接使用
+    VERIFY_COUNT = 3
+    # 连续生成失败多少次后暂停生成
+    MAX_FAILURES = 3
+    # 暂停生成后多久重新尝试（例如字幕组之后改用了规整的命名方式）
+    RETRY_INTERVAL = timedelta(days=1)
+
+    def __init__(self):
+        self._compiled: Dict[str, Optional[re.Pattern]] = {}
+
+    def _compile(self, pattern: str) -> Optional[re.Pattern]:
+        if pattern not in self._compiled:
+            try:
+                compiled = re.compile(pattern)
+                self._compiled[pattern] = compiled if compiled.groups >= 1 else None
+            except re.error:
+                self._compiled[pattern] = None
+        return self._compiled[pattern]
+
+    def match(self, pattern: Optional[str], file_path: str) -> Optional[int]:
+        """用正则表达式提取剧集，不匹配时返回None"""
+        compiled = self._compile(pattern) if pattern else None
+        if compiled is None:
+            return None
+        match = compiled.search(file_path)
+        if not match:
+            return None
+        try:
+            episode = int(match.group(1))
+        except (TypeError, ValueError):
+            return None
+        return episode if 0 < episode < 1000 else None
+
+    def is_verified(self, source: Source) -> bool:
+        return bool(source.learned_episode_regex) and source.learned_regex_checks >= self.VERIFY_COUNT
+
+    def extract(self, source: Source, file_path: str) -> Optional[int]:
+        """用已验证的正则表达式提取剧集，没有已验证的正则表达式或不匹配时返回None"""
+        if not self.is_verified(source):
+            return None
+        return self.match(source.learned_episode_regex, file_path)
+
+    def _reset(self, source: Source, failed: bool):
+        source.learned_episode_regex = None
+        source.learned_regex_checks = 0
+        if failed:
+            self._record_failure(source)
+
+    def _record_failure(self, source: Source):
+        source.learned_regex_failures += 1
+        if source.learned_regex_failures >= self.MAX_FAILURES and source.learned_regex_failed_at is None:
+            source.learned_regex_failed_at = datetime.utcnow()
+
+    def _clear_failures(self, source: Source):
+        source.learned_regex_failures = 0
+        source.learned_regex_failed_at = None
+
+    def _paused(self, source: Source) -> bool:
+        """失败次数达到上限且未过重试间隔时不再生成"""
+        if source.learned_regex_failures < self.MAX_FAILURES:
+            return False
+        failed_at = source.learned_regex_failed_at
+        if failed_at is not None and datetime.utcnow() - failed_at < self.RETRY_INTERVAL:
+            return True
+        # 旧版本没有记录失败时间，直接重新尝试
+        logging.info(f"来源 {source.title} 重新尝试生成剧集正则表达式")
+        self._clear_failures(source)
+        return False
+
+    async def learn(self, source: Source, answers: Dict[str, int]):
+        """
+        用AI判断的结果验证或生成正则表达式，调用方负责提交source的修改
+
+        Args:
+            answers: {文件路径: AI提取的剧集}
+        """
+        for file_path, episode in answers.items():
+            if source.learned_episode_regex:
+                if self.match(source.learned_episode_regex, file_path) == episode:
+                    source.learned_regex_checks += 1
+                    continue
+                if self.is_verified(source):
+                    # 已验证的正则表达式失效（例如字幕组更换了命名方式），允许重新生成
+                    logging.info(f"来源 {source.title} 的剧集正则表达式 {source.learned_episode_regex} 不再匹配 {file_path}")
+                    self._reset(source, failed=False)
+                    self._clear_failures(source)
+                else:
+                    self._reset(source, failed=True)
+
+            if self._paused(source):
+                continue
+            pattern = await ai_client.generate_episode_regex(file_path)
+            if pattern and self.match(pattern, file_path) == episode:
+                logging.info(f"来源 {source.title} 生成剧集正则表达式: {pattern}")
+                source.learned_episode_regex = pattern
+                source.learned_regex_checks = 1
+            else:
+                self._record_failure(source)
+
+        if self.is_verified(source) and source.learned_regex_failures:
+            self._clear_failures(source)
+
+# 创建全局剧集正则表达式学习实例
+episode_regex_learner = EpisodeRegexLearner()
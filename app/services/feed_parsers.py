@@ -0,0 +1,304 @@
+"""RSS/Atom/JSON Feed解析器
+
+根据内容自动选择解析器，所有格式的条目都转换为相同的字典：
+{"title", "link", "guid", "published", "magnet", "hash"}
+XML格式使用lxml增量解析，RSS条目字段遍历一次子元素提取；调用方停止迭代后剩余内容不再解析。
+内容应为响应的原始字节，由lxml根据XML声明识别编码；JSON Feed按UTF-8解码。
+"""
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+from lxml import etree
+import codecs
+import json
+import re
+
+ATOM_NS = "http://www.w3.org/2005/Atom"
+# 蜜柑计划（Mikan）的RSS把发布时间放在条目的torrent子元素中
+MIKAN_NS = "https://mikanani.me/0.1/"
+# 蜜柑计划的发布时间不带时区，为北京时间
+MIKAN_TZ = timezone(timedelta(hours=8))
+
+# 常见的pubDate格式，例如 "Mon, 01 Jan 2024 12:00:00 +0800"，其他格式交给email.utils解析
+RFC822_DATE = re.compile(
+    r"(?:[A-Za-z]{3},\s*)?(\d{1,2})\s+([A-Za-z]{3})\s+(\d{4})\s+(\d{2}):(\d{2})(?::(\d{2}))?\s+(GMT|UTC?|Z|[+-]\d{4})$"
+)
+MONTHS = {name: index for index, name in enumerate(
+    ("jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"), 1
+)}
+
+def parse_rfc822_date(value: str) -> Optional[datetime]:
+    """解析RSS的pubDate"""
+    match = RFC822_DATE.match(value)
+    if match and match.group(2).lower() in MONTHS:
+        day, month, year, hour, minute, second, zone = match.groups()
+        if zone[0] in "+-":
+            offset = timedelta(hours=int(zone[1:3]), minutes=int(zone[3:]))
+            tz = timezone(-offset if zone[0] == "-" else offset)
+        else:
+            tz = timezone.utc
+        try:
+            return datetime(
+                int(year), MONTHS[month.lower()], int(day), int(hour), int(minute), int(second or 0), tzinfo=tz
+            )
+        except ValueError:
+            return None
+    try:
+        return parsedate_to_datetime(value)
+    except Exception:
+        return None
+
+def parse_iso_date(value: str) -> Optional[datetime]:
+    """解析Atom和JSON Feed的ISO 8601时间"""
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except Exception:
+        return None
+
+def _clean(value: Optional[str]) -> Optional[str]:
+    if value is None:
+        return None
+    value = value.strip()
+    return value or None
+
+class FeedEntry(ABC):
+    """一个条目：基本信息立即提取，磁力链接的候选文本在需要时才提取"""
+    def __init__(self, info: Dict[str, Any]):
+        self.info = info
+
+    @abstractmethod
+    def texts(self) -> Iterator[str]:
+        """可能包含磁力链接的文本"""
+
+    @abstractmethod
+    def raw(self) -> str:
+        """条目的原始文本，用于查找种子文件链接"""
+
+class FeedParser(ABC):
+    """解析器基类，子类实现matches和iter_elements"""
+    name = ""
+
+    @abstractmethod
+    def matches(self, head: str) -> bool:
+        """根据内容开头判断是否由该解析器处理"""
+
+    @abstractmethod
+    def iter_elements(self, content: Union[str, bytes]) -> Iterator[Tuple[str, Any]]:
+        """依次产出 ("title", 标题) 和 ("item", FeedEntry)"""
+
+class _XMLEntry(FeedEntry):
+    def __init__(self, info: Dict[str, Any], elem, texts: Optional[List[str]] = None):
+        super().__init__(info)
+        self._elem = elem
+        self._texts = texts
+
+    def texts(self) -> Iterator[str]:
+        # 子元素的文本和属性（例如enclosure的url、Atom link的href），按顺序逐个产出，找到磁力链接后不再继续
+        if self._texts is not None:
+            yield from self._texts
+            return
+        for child in self._elem:
+            text = child.text
+            if text:
+                yield text
+            yield from child.values()
+
+    def raw(self) -> str:
+        return etree.tostring(self._elem, encoding="unicode")
+
+class XMLFeedParser(FeedParser):
+    """RSS 2.0和Atom解析器，根据条目元素区分格式"""
+    name = "xml"
+
+    RSS_ITEM = "item"
+    ATOM_ITEM = f"{{{ATOM_NS}}}entry"
+    ATOM_TITLE = f"{{{ATOM_NS}}}title"
+    ATOM_LINK = f"{{{ATOM_NS}}}link"
+
+    # RSS条目的基本字段，逐个检查子元素比XPath快（每个条目都要调用）
+    RSS_FIELDS = frozenset(("title", "link", "guid", "pubDate"))
+    MIKAN_TORRENT = f"{{{MIKAN_NS}}}torrent"
+    MIKAN_PUB_DATE = f"{{{MIKAN_NS}}}pubDate"
+    ATOM_FIELDS = etree.XPath("a:title | a:link | a:id | a:published | a:updated", namespaces={"a": ATOM_NS})
+
+    def matches(self, head: str) -> bool:
+        return head.startswith("<")
+
+    def _rss_entry(self, elem) -> _XMLEntry:
+        """遍历一次子元素，同时提取基本字段和可能包含磁力链接的文本"""
+        fields: Dict[Any, Optional[str]] = {}
+        texts = []
+        for child in elem:
+            tag = child.tag
+            text = child.text
+            if text:
+                texts.append(text)
+            texts.extend(child.values())
+            # 同名字段取第一个
+            if tag in self.RSS_FIELDS:
+                if tag not in fields:
+                    fields[tag] = _clean(text)
+            elif tag == self.MIKAN_TORRENT:
+                fields[self.MIKAN_PUB_DATE] = _clean(child.findtext(self.MIKAN_PUB_DATE))
+        pub_date = fields.get("pubDate")
+        published = parse_rfc822_date(pub_date) if pub_date else None
+        if published is None and fields.get(self.MIKAN_PUB_DATE):
+            published = parse_iso_date(fields[self.MIKAN_PUB_DATE])
+            if published is not None and published.tzinfo is None:
+                published = published.replace(tzinfo=MIKAN_TZ)
+        info = {
+            "title": fields.get("title"),
+            "link": fields.get("link"),
+            "guid": fields.get("guid"),
+            "published": published,
+            "magnet": None,
+            "hash": None,
+        }
+        return _XMLEntry(info, elem, texts)
+
+    def _atom_info(self, elem) -> Dict[str, Any]:
+        info: Dict[str, Any] = {"title": None, "link": None, "guid": None, "published": None, "magnet": None, "hash": None}
+        published = updated = None
+        for node in self.ATOM_FIELDS(elem):
+            tag = etree.QName(node).localname
+            if tag == "link":
+                # 没有rel或rel为alternate的链接是条目页面
+                if info["link"] is None and node.get("rel", "alternate") == "alternate":
+                    info["link"] = _clean(node.get("href"))
+            elif tag == "title" and info["title"] is None:
+                info["title"] = _clean(node.text)
+            elif tag == "id" and info["guid"] is None:
+                info["guid"] = _clean(node.text)
+            elif tag == "published":
+                published = _clean(node.text)
+            elif tag == "updated":
+                updated = _clean(node.text)
+        date = published or updated
+        info["published"] = parse_iso_date(date) if date else None
+        return info
+
+    def _feed_title(self, container) -> Optional[str]:
+        """RSS的channel或Atom的feed元素中的标题"""
+        if container is None:
+            return None
+        if container.tag == "rss":
+            container = container.find("channel")
+            if container is None:
+                return None
+        tag = self.ATOM_TITLE if container.tag == f"{{{ATOM_NS}}}feed" else "title"
+        return _clean(container.findtext(tag))
+
+    def iter_elements(self, content: Union[str, bytes], chunk_size: int = 64 * 1024) -> Iterator[Tuple[str, Any]]:
+        # 只产生条目的结束事件，不解析外部实体（避免XXE）
+        parser = etree.XMLPullParser(
+            events=("end",),
+            tag=(self.RSS_ITEM, self.ATOM_ITEM),
+            resolve_entities=False,
+            no_network=True
+        )
+        state = {"title_checked": False}
+
+        def read_events() -> Iterator[Tuple[str, Any]]:
+            for _, elem in parser.read_events():
+                parent = elem.getparent()
+                # 标题在条目之前，第一个条目结束时从父元素中读取
+                if not state["title_checked"]:
+                    state["title_checked"] = True
+                    title = self._feed_title(parent)
+                    if title:
+                        yield "title", title
+                if elem.tag == self.ATOM_ITEM:
+                    yield "item", _XMLEntry(self._atom_info(elem), elem)
+                else:
+                    yield "item", self._rss_entry(elem)
+                # 释放已处理的条目，条目已经结束，从父元素中移除不影响后续解析
+                elem.clear()
+                if parent is not None:
+                    parent.remove(elem)
+
+        for offset in range(0, len(content), chunk_size):
+            parser.feed(content[offset:offset + chunk_size])
+            yield from read_events()
+        root = parser.close()
+        yield from read_events()
+        # 没有条目的订阅
+        if not state["title_checked"]:
+            title = self._feed_title(root)
+            if title:
+                yield "title", title
+
+class _JSONEntry(FeedEntry):
+    def __init__(self, info: Dict[str, Any], item: Dict[str, Any]):
+        super().__init__(info)
+        self._item = item
+
+    def texts(self) -> Iterator[str]:
+        for key in ("url", "external_url", "content_text", "content_html", "summary"):
+            if isinstance(self._item.get(key), str):
+                yield self._item[key]
+        for attachment in self._item.get("attachments") or []:
+            if isinstance(attachment, dict) and isinstance(attachment.get("url"), str):
+                yield attachment["url"]
+
+    def raw(self) -> str:
+        return json.dumps(self._item, ensure_ascii=False)
+
+class JSONFeedParser(FeedParser):
+    """JSON Feed（https://jsonfeed.org）解析器"""
+    name = "json"
+
+    def matches(self, head: str) -> bool:
+        return head.startswith("{")
+
+    def iter_elements(self, content: Union[str, bytes]) -> Iterator[Tuple[str, Any]]:
+        if isinstance(content, bytes):
+            content = content.decode("utf-8", errors="replace")
+        feed = json.loads(content)
+        if not isinstance(feed, dict) or not str(feed.get("version", "")).startswith("https://jsonfeed.org/"):
+            raise ValueError("不是JSON Feed")
+        title = _clean(feed.get("title")) if isinstance(feed.get("title"), str) else None
+        if title:
+            yield "title", title
+        for item in feed.get("items") or []:
+            if not isinstance(item, dict):
+                continue
+            date = item.get("date_published") or item.get("date_modified")
+            info = {
+                "title": _clean(item.get("title")) if isinstance(item.get("title"), str) else None,
+                "link": _clean(item.get("url")) if isinstance(item.get("url"), str) else None,
+                "guid": _clean(str(item["id"])) if item.get("id") is not None else None,
+                "published": parse_iso_date(date) if isinstance(date, str) else None,
+                "magnet": None,
+                "hash": None,
+            }
+            yield "item", _JSONEntry(info, item)
+
+# 已注册的解析器，按顺序匹配
+feed_parsers: List[FeedParser] = [JSONFeedParser(), XMLFeedParser()]
+
+def get_feed_parser(content: Union[str, bytes]) -> FeedParser:
+    """根据内容选择解析器，content需要已去掉开头的BOM和空白"""
+    head = content[:1024]
+    if isinstance(head, bytes):
+        # 只需要判断开头的ASCII字符，latin-1解码不会失败
+        head = head.decode("latin-1")
+    for parser in feed_parsers:
+        if parser.matches(head):
+            return parser
+    raise ValueError("无法识别的订阅格式")
+
+def iter_feed(content: Union[str, bytes]) -> Iterator[Tuple[str, Any]]:
+    """自动识别格式并增量解析，依次产出 ("title", 标题) 和 ("item", FeedEntry)"""
+    if isinstance(content, bytes):
+        # UTF-16的内容无法按字节判断格式，先解码
+        if content.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+            content = content.decode("utf-16")
+        else:
+            # 部分站点在XML声明或JSON之前输出BOM或空行
+            if content.startswith(codecs.BOM_UTF8):
+                content = content[len(codecs.BOM_UTF8):]
+            content = content.lstrip(b" \t\r\n")
+    if isinstance(content, str):
+        content = content.lstrip("\ufeff \t\r\n")
+    return get_feed_parser(content).iter_elements(content)
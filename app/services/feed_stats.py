@@ -0,0 +1,109 @@
+from typing import Any, Dict, Iterable, List, Optional
+from datetime import datetime
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.session import async_session
+from app.models.database import FeedStat
+import bisect
+import json
+
+class FeedStatsRecorder:
+    """记录每个RSS源的抓取统计，用于找出慢、大或不稳定的源"""
+    # 直方图的桶上界（毫秒），最后一个桶为超过最大上界的次数
+    LATENCY_BUCKETS = [100, 300, 1000, 3000, 10000]
+    PARSE_BUCKETS = [10, 50, 200, 1000]
+
+    def _observe(self, histogram: Optional[str], buckets: List[int], value: float) -> str:
+        """将一次观测计入直方图"""
+        counts = json.loads(histogram) if histogram else []
+        if len(counts) != len(buckets) + 1:
+            counts = [0] * (len(buckets) + 1)
+        counts[bisect.bisect_left(buckets, value)] += 1
+        return json.dumps(counts)
+
+    def histogram_labels(self, buckets: List[int]) -> List[str]:
+        """直方图各个桶的标签"""
+        labels = [f"≤{bound}ms" for bound in buckets]
+        labels.append(f">{buckets[-1]}ms")
+        return labels
+
+    async def record(
+        self,
+        source_id: int,
+        feed: Dict[str, Any],
+        new_count: int = 0,
+        error: Optional[str] = None
+    ):
+        """记录一次检查的结果
+
+        Args:
+            feed: rss_parser.poll_feed的返回值
+            new_count: 新添加的种子数
+            error: 抓取或处理失败时的错误信息
+        """
+        now = datetime.utcnow()
+        async with async_session() as db:
+            result = await db.execute(select(FeedStat).where(FeedStat.source_id == source_id))
+            stat = result.scalar_one_or_none()
+            if stat is None:
+                stat = FeedStat(
+                    source_id=source_id,
+                    fetch_count=0,
+                    error_count=0,
+                    not_modified_count=0,
+                    total_latency_ms=0.0,
+                    total_bytes=0,
+                    total_new_count=0,
+                )
+                db.add(stat)
+
+            stat.fetch_count += 1
+            stat.last_fetch_at = now
+            stat.last_status = feed.get("status")
+            if feed.get("fetch_ms") is not None:
+                stat.last_latency_ms = feed["fetch_ms"]
+                stat.total_latency_ms += feed["fetch_ms"]
+                stat.latency_histogram = self._observe(stat.latency_histogram, self.LATENCY_BUCKETS, feed["fetch_ms"])
+            if feed.get("bytes") is not None:
+                stat.last_bytes = feed["bytes"]
+                stat.total_bytes += feed["bytes"]
+            if feed.get("parse_ms") is not None:
+                stat.last_parse_ms = feed["parse_ms"]
+                stat.parse_histogram = self._observe(stat.parse_histogram, self.PARSE_BUCKETS, feed["parse_ms"])
+
+            error = error or feed.get("error")
+            if error:
+                stat.error_count += 1
+                stat.last_error = error
+                stat.last_error_at = now
+            else:
+                if feed.get("not_modified"):
+                    stat.not_modified_count += 1
+                stat.last_item_count = len(feed.get("items") or [])
+                stat.last_new_count = new_count
+                stat.total_new_count += new_count
+            await db.commit()
+
+    async def get_stats(self, db: AsyncSession, source_ids: Iterable[int]) -> Dict[int, Dict[str, Any]]:
+        """获取多个RSS源的抓取统计，附带平均耗时和直方图"""
+        source_ids = list(source_ids)
+        if not source_ids:
+            return {}
+        result = await db.execute(select(FeedStat).where(FeedStat.source_id.in_(source_ids)))
+        stats = {}
+        for stat in result.scalars():
+            data = stat.dict()
+            data["avg_latency_ms"] = stat.total_latency_ms / stat.fetch_count if stat.fetch_count else None
+            data["latency_histogram"] = list(zip(
+                self.histogram_labels(self.LATENCY_BUCKETS),
+                json.loads(stat.latency_histogram) if stat.latency_histogram else [0] * (len(self.LATENCY_BUCKETS) + 1)
+            ))
+            data["parse_histogram"] = list(zip(
+                self.histogram_labels(self.PARSE_BUCKETS),
+                json.loads(stat.parse_histogram) if stat.parse_histogram else [0] * (len(self.PARSE_BUCKETS) + 1)
+            ))
+            stats[stat.source_id] = data
+        return stats
+
+# 创建全局抓取统计实例
+feed_stats = FeedStatsRecorder()
@@ -0,0 +1,180 @@
+from typing import Any, Dict, List, Optional
+from datetime import datetime
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.session import async_session
+from app.models.database import ClassifyStat
+import re
+import statistics
+
+class FileRuleClassifier:
+    """基于规则的文件分类，在请求AI之前处理明显的情况
+
+    扩展名、目录名和文件名关键字以及与同种子其他视频的大小对比都能确定时直接给出结果，
+    无法确定的文件返回None，交给AI判断。
+    """
+    VIDEO_EXTENSIONS = {".mkv", ".mp4", ".avi", ".ts", ".m2ts", ".mov", ".wmv", ".flv", ".webm", ".rmvb"}
+    SUBTITLE_EXTENSIONS = {".ass", ".ssa", ".srt", ".sub", ".idx", ".sup", ".vtt"}
+
+    # 目录名（整个目录名匹配，忽略大小写）对应的文件类型
+    FOLDER_TYPES = [
+        (re.compile(r"^(sps?|specials?|tokuten|特典|映像特典|oads?|ovas?|番外)$", re.I), "sp"),
+        (re.compile(r"^(nc ?ops?|openings?)$", re.I), "op"),
+        (re.compile(r"^(nc ?eds?|endings?)$", re.I), "ed"),
+        (re.compile(r"^(samples?|trailers?|previews?|pvs?|cms?|extras?|bonus|menus?|cds?|scans?|bks?|fonts?|music|ost|interviews?|花絮|扫图)$", re.I), "other"),
+    ]
+    # 文件名中的关键字对应的文件类型
+    NAME_TYPES = [
+        (re.compile(r"\bnc ?op\d*\b|\bnon-?credit opening\b", re.I), "op"),
+        (re.compile(r"\bnc ?ed\d*\b|\bnon-?credit ending\b", re.I), "ed"),
+        (re.compile(r"\b(sample|trailer|preview|teaser|menu)\b|\bpv\d*\b|\bcm\d*\b|预告", re.I), "other"),
+        (re.compile(r"\b(ova|oad|sp\d*|special)\b|特典|番外", re.I), "sp"),
+    ]
+    # 常见的集数格式，只接受唯一的匹配结果；小数集数（例如 - 12.5）交给AI判断
+    EPISODE_PATTERNS = [
+        re.compile(r"\[(\d{1,3})(?:v\d)?(?:\s?END)?\]", re.I),
+        re.compile(r"\s-\s(\d{1,3})(?:v\d)?(?:\s?END)?(?=[\s\[\(]|\.(?!\d)|$)", re.I),
+        re.compile(r"\bS\d{1,2}E(\d{1,3})\b(?!\.\d)", re.I),
+        re.compile(r"\bE[Pp]?\.?(\d{1,3})\b(?!\.\d)"),
+        re.compile(r"第(\d{1,3})[话話集]"),
+    ]
+    # 小于同种子视频大小中位数的这个比例视为样片或预告
+    SIZE_OUTLIER_RATIO = 0.2
+    # 至少有这么多个视频时才比较大小
+    SIZE_OUTLIER_MIN_FILES = 3
+
+    def __init__(self):
+        # 本进程中规则能确定和不能确定的文件数，包括不保存到数据库的非正片文件
+        self.hits = 0
+        self.misses = 0
+
+    def _extension(self, path: str) -> str:
+        name = path.rsplit("/", 1)[-1]
+        return "." + name.rsplit(".", 1)[-1].lower() if "." in name else ""
+
+    def main_file_type(self, path: str) -> Optional[str]:
+        """可能是正片的文件类型：视频为episode，字幕为subtitle，其他文件为None"""
+        extension = self._extension(path)
+        if extension in self.VIDEO_EXTENSIONS:
+            return "episode"
+        if extension in self.SUBTITLE_EXTENSIONS:
+            return "subtitle"
+        return None
+
+    def extract_episode(self, path: str) -> Optional[int]:
+        """用常见格式从文件名中提取集数，没有或有多个不同结果时返回None"""
+        name = path.replace("\\", "/").rsplit("/", 1)[-1]
+        name = re.sub(r"\d{3,4}[pP]|[xX]26[45]|[hH]\.?26[45]|\b(?:19|20)\d{2}\b", " ", name)
+        episodes = set()
+        for pattern in self.EPISODE_PATTERNS:
+            for match in pattern.finditer(name):
+                episodes.add(int(match.group(1)))
+        if len(episodes) != 1:
+            return None
+        episode = episodes.pop()
+        return episode if 0 < episode < 1000 else None
+
+    def classify(self, path: str, size: int = 0, video_median: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """
+        判断单个文件
+
+        Args:
+            path: 相对于种子根目录的路径
+            size: 文件大小
+            video_median: 同种子中视频文件大小的中位数，视频较少时为None
+
+        Returns:
+            与ai_client.classify_files相同格式的结果，无法确定时返回None
+        """
+        extension = self._extension(path)
+        is_video = extension in self.VIDEO_EXTENSIONS
+        is_subtitle = extension in self.SUBTITLE_EXTENSIONS
+        # 既不是视频也不是字幕：图片、文本、音频、校验文件等
+        if not is_video and not is_subtitle:
+            return self._result("other")
+
+        parts = path.replace("\\", "/").split("/")
+        for folder in parts[:-1]:
+            for pattern, file_type in self.FOLDER_TYPES:
+                if pattern.match(folder.strip()):
+                    return self._result(file_type)
+        for pattern, file_type in self.NAME_TYPES:
+            if pattern.search(parts[-1]):
+                return self._result(file_type)
+
+        if is_video and video_median and size < video_median * self.SIZE_OUTLIER_RATIO:
+            return self._result("other")
+
+        # 正片只有在能确定集数时才直接处理
+        episode = self.extract_episode(path)
+        if episode is None:
+            return None
+        return self._result("subtitle" if is_subtitle else "episode", episode)
+
+    def classify_files(self, files: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """
+        判断一个种子中的所有文件
+
+        Args:
+            files: [{"name": 路径, "size": 大小}]
+
+        Returns:
+            {路径: 结果}，只包含能够确定的文件
+        """
+        video_sizes = [
+            file.get("size", 0) for file in files
+            if self._extension(file.get("name", "")) in self.VIDEO_EXTENSIONS
+        ]
+        video_median = statistics.median(video_sizes) if len(video_sizes) >= self.SIZE_OUTLIER_MIN_FILES else None
+        results = {}
+        for file in files:
+            path = file.get("name", "")
+            if not path:
+                continue
+            result = self.classify(path, file.get("size", 0), video_median)
+            if result:
+                results[path] = result
+                self.hits += 1
+            else:
+                self.misses += 1
+        return results
+
+    async def record(self, counts: Dict[str, int]):
+        """累加各判断方式处理的文件数，counts为 {判断方式: 文件数}"""
+        now = datetime.utcnow()
+        async with async_session() as db:
+            for classified_by, count in counts.items():
+                if not count:
+                    continue
+                stmt = sqlite_insert(ClassifyStat).values(classified_by=classified_by, file_count=count, updated_at=now)
+                await db.execute(stmt.on_conflict_do_update(
+                    index_elements=["classified_by"],
+                    set_={"file_count": ClassifyStat.file_count + stmt.excluded.file_count, "updated_at": now}
+                ))
+            await db.commit()
+
+    async def get_stats(self, db: AsyncSession) -> Dict[str, Any]:
+        """统计使用AI提取剧集的来源的文件由哪种方式判断，用于衡量规则节省的AI请求"""
+        result = await db.execute(select(ClassifyStat.classified_by, ClassifyStat.file_count))
+        counts = {by: count for by, count in result}
+        ai_total = sum(counts.values())
+        checked = self.hits + self.misses
+        return {
+            "counts": counts,
+            "saved_rule_rate": counts.get("rule", 0) / ai_total if ai_total else None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / checked if checked else None,
+        }
+
+    def _result(self, file_type: str, episode: Optional[int] = None) -> Dict[str, Any]:
+        return {
+            "is_main": file_type in ("episode", "subtitle"),
+            "file_type": file_type,
+            "episode": episode,
+            "confidence": 1.0,
+        }
+
+# 创建全局文件规则分类实例
+file_rules = FileRuleClassifier()
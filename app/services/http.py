@@ -0,0 +1,58 @@
+from typing import Dict, Tuple
+from app.core.config import settings
+import aiohttp
+import logging
+
+class HTTPSessions:
+    """按服务划分的aiohttp会话
+
+    每个服务（RSS、TMDB、LLM）使用独立的连接池，连接和DNS解析结果在请求之间复用。
+    会话在应用启动时创建、关闭时释放；未启动时（例如脚本中）首次使用会自动创建。
+    """
+    def __init__(self):
+        self._sessions: Dict[str, aiohttp.ClientSession] = {}
+
+    def _service_config(self, name: str) -> Tuple[int, int]:
+        """服务的 (最大连接数, 总超时时间)"""
+        config = settings.http
+        return {
+            "rss": (config.rss_limit, config.rss_timeout),
+            "tmdb": (config.tmdb_limit, config.tmdb_timeout),
+            "llm": (config.llm_limit, config.llm_timeout),
+        }[name]
+
+    def _create(self, name: str) -> aiohttp.ClientSession:
+        config = settings.http
+        limit, timeout = self._service_config(name)
+        connector = aiohttp.TCPConnector(
+            limit=limit,
+            ttl_dns_cache=config.dns_cache_ttl,
+            keepalive_timeout=config.keepalive_timeout,
+        )
+        return aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=timeout, connect=config.connect_timeout),
+        )
+
+    def get(self, name: str) -> aiohttp.ClientSession:
+        """获取服务的会话"""
+        session = self._sessions.get(name)
+        if session is None or session.closed:
+            session = self._create(name)
+            self._sessions[name] = session
+        return session
+
+    async def open(self):
+        """创建所有服务的会话"""
+        for name in ("rss", "tmdb", "llm"):
+            self.get(name)
+        logging.info("HTTP会话已创建")
+
+    async def close(self):
+        """关闭所有会话"""
+        for session in self._sessions.values():
+            await session.close()
+        self._sessions = {}
+
+# 创建全局HTTP会话实例
+http_sessions = HTTPSessions()
@@ -0,0 +1,242 @@
+from typing import Optional, Dict, Any, Callable, Awaitable, List
+from datetime import datetime, timedelta
+from sqlalchemy import select, update, delete, or_, and_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from app.db.session import async_session
+from app.models.database import Job
+from app.core.config import settings
+import asyncio
+import json
+import logging
+import os
+
+JobHandler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+class JobQueue:
+    """基于SQLite的持久化任务队列
+
+    任务通过租约(lease)领取，处理成功后确认(ack)，失败后按指数退避重试。
+    进程崩溃时租约到期的任务会被重新领取，因此重启后未完成的任务会继续执行。
+    """
+    def __init__(self):
+        self._handlers: Dict[str, JobHandler] = {}
+        self._wakeup = asyncio.Event()
+        self._workers: List[asyncio.Task] = []
+        self._worker_prefix = f"{os.getpid()}"
+
+    def register(self, kind: str, handler: JobHandler):
+        """注册任务处理函数"""
+        self._handlers[kind] = handler
+
+    def _dedupe_key(self, kind: str, payload: Dict[str, Any]) -> str:
+        return f"{kind}:{json.dumps(payload, sort_keys=True)}"
+
+    async def enqueue(self, kind: str, payload: Dict[str, Any]) -> Optional[int]:
+        """添加任务，已有相同的未完成任务时不重复添加，返回任务ID
+
+        多个进程（例如完成回调和轮询）同时添加时，由部分唯一索引保证只插入一个
+        """
+        dedupe_key = self._dedupe_key(kind, payload)
+        now = datetime.utcnow()
+        async with async_session() as db:
+            result = await db.execute(
+                sqlite_insert(Job)
+                .values(
+                    kind=kind,
+                    payload=json.dumps(payload, sort_keys=True),
+                    dedupe_key=dedupe_key,
+                    status="pending",
+                    attempts=0,
+                    max_attempts=settings.scheduler.job_max_attempts,
+                    available_at=now,
+                    created_at=now,
+                    updated_at=now,
+                )
+                .on_conflict_do_nothing(
+                    index_elements=["kind", "dedupe_key"],
+                    index_where=Job.status.in_(["pending", "running"])
+                )
+                .returning(Job.id)
+            )
+            job_id = result.scalar_one_or_none()
+            if job_id is None:
+                result = await db.execute(
+                    select(Job.id).where(
+                        Job.kind == kind,
+                        Job.dedupe_key == dedupe_key,
+                        Job.status.in_(["pending", "running"])
+                    )
+                )
+                await db.commit()
+                logging.info(f"任务 {dedupe_key} 已在队列中")
+                return result.scalar_one_or_none()
+            await db.commit()
+        logging.info(f"任务已加入队列: {dedupe_key} (ID: {job_id})")
+        self._wakeup.set()
+        return job_id
+
+    async def lease(self, worker: str) -> Optional[Job]:
+        """领取一个可执行的任务：等待中且已到重试时间，或租约已过期的运行中任务"""
+        now = datetime.utcnow()
+        candidate = (
+            select(Job.id)
+            .where(or_(
+                and_(Job.status == "pending", Job.available_at <= now),
+                and_(Job.status == "running", Job.lease_until < now),
+            ))
+            .order_by(Job.available_at, Job.id)
+            .limit(1)
+            .scalar_subquery()
+        )
+        async with async_session() as db:
+            # 单条UPDATE语句完成领取，多个worker不会领到同一个任务
+            result = await db.execute(
+                update(Job)
+                .where(Job.id == candidate)
+                .values(
+                    status="running",
+                    worker=worker,
+                    attempts=Job.attempts + 1,
+                    lease_until=now + timedelta(seconds=settings.scheduler.job_lease_seconds),
+                    updated_at=now,
+                )
+                .returning(Job)
+                .execution_options(synchronize_session=False)
+            )
+            job = result.scalar_one_or_none()
+            await db.commit()
+            return job
+
+    async def extend_lease(self, job_id: int):
+        """延长任务租约"""
+        now = datetime.utcnow()
+        async with async_session() as db:
+            await db.execute(
+                update(Job)
+                .where(Job.id == job_id, Job.status == "running")
+                .values(
+                    lease_until=now + timedelta(seconds=settings.scheduler.job_lease_seconds),
+                    updated_at=now,
+                )
+            )
+            await db.commit()
+
+    async def ack(self, job_id: int):
+        """确认任务完成"""
+        now = datetime.utcnow()
+        async with async_session() as db:
+            await db.execute(
+                update(Job)
+                .where(Job.id == job_id)
+                .values(status="done", lease_until=None, last_error=None, updated_at=now, finished_at=now)
+            )
+            await db.commit()
+
+    async def fail(self, job: Job, error: str):
+        """任务失败，未超过最大重试次数时按指数退避重新排队"""
+        now = datetime.utcnow()
+        values: Dict[str, Any] = {"lease_until": None, "last_error": error, "updated_at": now}
+        if job.attempts >= job.max_attempts:
+            values.update(status="failed", finished_at=now)
+            logging.error(f"任务 {job.kind} (ID: {job.id}) 重试 {job.attempts} 次后仍然失败: {error}")
+        else:
+            delay = min(
+                settings.scheduler.job_retry_base * (2 ** (job.attempts - 1)),
+                settings.scheduler.job_retry_max
+            )
+            values.update(status="pending", available_at=now + timedelta(seconds=delay))
+            logging.warning(f"任务 {job.kind} (ID: {job.id}) 第 {job.attempts} 次执行失败，{delay} 秒后重试: {error}")
+        async with async_session() as db:
+            await db.execute(update(Job).where(Job.id == job.id).values(**values))
+            await db.commit()
+
+    async def recover(self):
+        """成为主进程时回收租约已过期的运行中任务，并清理过期的已完成任务
+
+        租约未过期的任务可能仍在上一个主进程中执行，不回收，租约到期后再由lease领取
+        """
+        now = datetime.utcnow()
+        async with async_session() as db:
+            result = await db.execute(
+                update(Job)
+                .where(
+                    Job.status == "running",
+                    or_(Job.lease_until.is_(None), Job.lease_until < now)
+                )
+                .values(status="pending", lease_until=None, available_at=now, updated_at=now)
+            )
+            if result.rowcount:
+                logging.info(f"回收了 {result.rowcount} 个未完成的任务")
+            await db.execute(
+                delete(Job).where(
+                    Job.status == "done",
+                    Job.finished_at < now - timedelta(days=7)
+                )
+            )
+            await db.commit()
+
+    async def _run_job(self, job: Job):
+        """执行任务，运行期间定期续租"""
+        handler = self._handlers.get(job.kind)
+        if handler is None:
+            await self.fail(job, f"未知的任务类型: {job.kind}")
+            return
+
+        async def heartbeat():
+            while True:
+                await asyncio.sleep(settings.scheduler.job_lease_seconds / 3)
+                try:
+                    await self.extend_lease(job.id)
+                except Exception as e:
+                    logging.warning(f"任务 {job.id} 续租失败: {str(e)}")
+
+        heartbeat_task = asyncio.create_task(heartbeat())
+        try:
+            await handler(json.loads(job.payload))
+        except Exception as e:
+            await self.fail(job, str(e))
+        else:
+            await self.ack(job.id)
+        finally:
+            heartbeat_task.cancel()
+
+    async def _worker(self, worker: str):
+        """worker循环：领取任务并执行，队列为空时等待新任务或轮询间隔"""
+        while True:
+            try:
+                job = await self.lease(worker)
+            except Exception as e:
+                logging.error(f"{worker} 领取任务失败: {str(e)}")
+                job = None
+
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=settings.scheduler.job_poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            logging.info(f"{worker} 开始执行任务 {job.kind} (ID: {job.id}, 第 {job.attempts} 次)")
+            try:
+                await self._run_job(job)
+            except Exception as e:
+                # 记录结果失败（例如数据库被锁）时任务保持运行中状态，租约到期后会被重新领取
+                logging.error(f"{worker} 记录任务 {job.id} 的结果失败: {str(e)}")
+
+    async def start(self, workers: int):
+        """回收遗留任务并启动worker"""
+        await self.recover()
+        for i in range(workers):
+            worker = f"{self._worker_prefix}-{i}"
+            self._workers.append(asyncio.create_task(self._worker(worker)))
+        logging.info(f"已启动 {workers} 个任务worker")
+
+    def stop(self):
+        """停止所有worker，正在执行的任务会在租约到期后被重新领取"""
+        for task in self._workers:
+            task.cancel()
+        self._workers = []
+
+# 创建全局任务队列实例
+job_queue = JobQueue()
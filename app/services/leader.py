@@ -0,0 +1,109 @@
+from typing import Callable, Awaitable
+from datetime import datetime, timedelta
+from sqlalchemy import update, or_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from app.db.session import async_session
+from app.models.database import SchedulerLease
+from app.core.config import settings
+import asyncio
+import logging
+import os
+import socket
+import uuid
+
+class LeaderElection:
+    """基于数据库租约的主进程选举
+
+    多个uvicorn worker共享同一个数据库，只有持有租约的进程运行后台任务。
+    主进程定期续租，进程退出或卡死时租约过期，其他进程自动接管。
+    """
+    def __init__(self, name: str = "scheduler"):
+        self.name = name
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.is_leader = False
+
+    async def try_acquire(self) -> bool:
+        """尝试获取或续期租约，返回当前进程是否持有租约"""
+        now = datetime.utcnow()
+        async with async_session() as db:
+            # 确保租约记录存在
+            await db.execute(
+                sqlite_insert(SchedulerLease)
+                .values(name=self.name, owner=None, expires_at=now)
+                .on_conflict_do_nothing(index_elements=["name"])
+            )
+            # 租约属于自己或已过期时才能获取，单条UPDATE保证只有一个进程成功
+            result = await db.execute(
+                update(SchedulerLease)
+                .where(
+                    SchedulerLease.name == self.name,
+                    or_(SchedulerLease.owner == self.owner, SchedulerLease.expires_at <= now)
+                )
+                .values(
+                    owner=self.owner,
+                    expires_at=now + timedelta(seconds=settings.scheduler.leader_lease_seconds),
+                    renewed_at=now
+                )
+            )
+            await db.commit()
+            return result.rowcount == 1
+
+    async def release(self):
+        """释放租约，让其他进程立即接管"""
+        async with async_session() as db:
+            await db.execute(
+                update(SchedulerLease)
+                .where(SchedulerLease.name == self.name, SchedulerLease.owner == self.owner)
+                .values(expires_at=datetime.utcnow())
+            )
+            await db.commit()
+        self.is_leader = False
+
+    async def _step_down(self, on_demoted: Callable[[], Awaitable[None]]):
+        """停止后台任务并释放租约，任何一步失败都不影响其他步骤"""
+        try:
+            await on_demoted()
+        except Exception as e:
+            logging.error(f"停止后台任务失败: {str(e)}")
+        try:
+            await self.release()
+        except Exception as e:
+            # 无法释放时租约会自然过期
+            logging.error(f"释放调度租约失败: {str(e)}")
+        self.is_leader = False
+
+    async def run(
+        self,
+        on_elected: Callable[[], Awaitable[None]],
+        on_demoted: Callable[[], Awaitable[None]]
+    ):
+        """持续竞选和续租，角色变化时调用对应的回调"""
+        while True:
+            try:
+                acquired = await self.try_acquire()
+            except Exception as e:
+                # 无法确认租约时按失去租约处理，避免与新的主进程同时运行
+                logging.error(f"续期调度租约失败: {str(e)}")
+                acquired = False
+
+            if acquired and not self.is_leader:
+                self.is_leader = True
+                logging.info(f"进程 {self.owner} 获得调度租约")
+                try:
+                    await on_elected()
+                except Exception as e:
+                    # 后台任务没有完整启动，停止已启动的部分并让出租约，下次循环重新竞选
+                    logging.error(f"启动后台任务失败，让出调度租约: {str(e)}")
+                    await self._step_down(on_demoted)
+            elif not acquired and self.is_leader:
+                self.is_leader = False
+                logging.warning(f"进程 {self.owner} 失去调度租约")
+                try:
+                    await on_demoted()
+                except Exception as e:
+                    logging.error(f"停止后台任务失败: {str(e)}")
+
+            await asyncio.sleep(settings.scheduler.leader_renew_interval)
+
+# 创建全局主进程选举实例
+leader_election = LeaderElection()
@@ -0,0 +1,173 @@
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from datetime import datetime, timedelta
+from functools import wraps
+from sqlalchemy import select, update, delete, func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from app.core.config import settings
+from app.db.session import async_session
+from app.models.database import LLMCache
+import hashlib
+import json
+import logging
+import re
+import unicodedata
+
+class LLMResponseCache:
+    """AI分析结果的持久化缓存
+
+    缓存键由方法名、模型名、提示词版本和规范化后的输入组成，修改提示词时增加版本号即可让旧结果失效。
+    只缓存成功的结果（非None），请求失败时下次仍会重新请求。
+    """
+    # 每写入多少条记录检查一次过期和容量
+    EVICT_EVERY = 100
+
+    def __init__(self):
+        self.hits: Dict[str, int] = {}
+        self.misses: Dict[str, int] = {}
+        self._writes = 0
+
+    def normalize(self, text: str) -> str:
+        """规范化输入：统一全角半角字符，合并连续空白"""
+        text = unicodedata.normalize("NFKC", text)
+        return re.sub(r"\s+", " ", text).strip()
+
+    def make_key(self, method: str, text: str, version: int = 1, per_model: bool = True) -> str:
+        """缓存键，per_model为False时结果与模型无关（例如搜索结果）"""
+        raw = json.dumps(
+            [method, settings.llm.model_name if per_model else None, version, self.normalize(text)],
+            ensure_ascii=False
+        )
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    async def get(self, method: str, text: str, version: int = 1, per_model: bool = True) -> Tuple[bool, Any]:
+        """查找缓存，返回 (是否命中, 缓存的值)"""
+        key = self.make_key(method, text, version, per_model)
+        now = datetime.utcnow()
+        async with async_session() as db:
+            result = await db.execute(
+                select(LLMCache.id, LLMCache.value)
+                .where(LLMCache.key == key, LLMCache.expires_at > now)
+            )
+            row = result.first()
+            if row is not None:
+                await db.execute(
+                    update(LLMCache)
+                    .where(LLMCache.id == row.id)
+                    .values(hit_count=LLMCache.hit_count + 1, last_used_at=now)
+                )
+                await db.commit()
+        if row is None:
+            self.misses[method] = self.misses.get(method, 0) + 1
+            return False, None
+        self.hits[method] = self.hits.get(method, 0) + 1
+        return True, json.loads(row.value)
+
+    async def put(
+        self,
+        method: str,
+        text: str,
+        value: Any,
+        version: int = 1,
+        ttl: Optional[int] = None,
+        per_model: bool = True
+    ):
+        """写入缓存，ttl为空时使用配置的有效期"""
+        now = datetime.utcnow()
+        values = {
+            "key": self.make_key(method, text, version, per_model),
+            "method": method,
+            "value": json.dumps(value, ensure_ascii=False),
+            "hit_count": 0,
+            "created_at": now,
+            "expires_at": now + timedelta(seconds=ttl or settings.llm.cache_ttl),
+            "last_used_at": now,
+        }
+        stmt = sqlite_insert(LLMCache).values(**values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["key"],
+            set_={name: stmt.excluded[name] for name in ("value", "hit_count", "created_at", "expires_at", "last_used_at")}
+        )
+        async with async_session() as db:
+            await db.execute(stmt)
+            await db.commit()
+
+        self._writes += 1
+        if self._writes % self.EVICT_EVERY == 0:
+            await self.evict()
+
+    async def evict(self) -> int:
+        """删除过期的记录，超出容量时删除最久未使用的记录，返回删除的条数"""
+        now = datetime.utcnow()
+        async with async_session() as db:
+            result = await db.execute(delete(LLMCache).where(LLMCache.expires_at <= now))
+            removed = result.rowcount or 0
+            total = await db.scalar(select(func.count(LLMCache.id)))
+            overflow = total - settings.llm.cache_max_entries
+            if overflow > 0:
+                oldest = select(LLMCache.id).order_by(LLMCache.last_used_at).limit(overflow)
+                result = await db.execute(delete(LLMCache).where(LLMCache.id.in_(oldest)))
+                removed += result.rowcount or 0
+            await db.commit()
+        if removed:
+            logging.info(f"AI缓存淘汰了 {removed} 条记录")
+        return removed
+
+    def cached(self, method: str, version: int = 1) -> Callable:
+        """缓存异步方法的结果，方法的第一个参数为输入文本
+
+        用法：
+            @llm_cache.cached("extract_episode", version=1)
+            async def extract_episode(self, title: str) -> Optional[int]: ...
+        """
+        def decorator(fn: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+            @wraps(fn)
+            async def wrapper(owner, text: str, *args, **kwargs):
+                if not settings.llm.cache_enable or args or kwargs:
+                    return await fn(owner, text, *args, **kwargs)
+                try:
+                    hit, value = await self.get(method, text, version)
+                    if hit:
+                        return value
+                except Exception as e:
+                    logging.warning(f"读取AI缓存失败: {str(e)}")
+
+                value = await fn(owner, text)
+                if value is not None:
+                    try:
+                        await self.put(method, text, value, version)
+                    except Exception as e:
+                        logging.warning(f"写入AI缓存失败: {str(e)}")
+                return value
+            return wrapper
+        return decorator
+
+    async def get_stats(self) -> Dict[str, Any]:
+        """缓存统计：本进程的命中/未命中次数，以及数据库中各方法的记录数"""
+        async with async_session() as db:
+            result = await db.execute(
+                select(LLMCache.method, func.count(LLMCache.id), func.sum(LLMCache.hit_count))
+                .group_by(LLMCache.method)
+            )
+            rows = result.all()
+        methods = set(self.hits) | set(self.misses) | {row[0] for row in rows}
+        entries = {row[0]: {"entries": row[1], "total_hits": row[2] or 0} for row in rows}
+        stats = {}
+        for method in sorted(methods):
+            hits = self.hits.get(method, 0)
+            misses = self.misses.get(method, 0)
+            stats[method] = {
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": hits / (hits + misses) if hits + misses else None,
+                "entries": entries.get(method, {}).get("entries", 0),
+                "total_hits": entries.get(method, {}).get("total_hits", 0),
+            }
+        return {
+            "enabled": settings.llm.cache_enable,
+            "entries": sum(item["entries"] for item in entries.values()),
+            "max_entries": settings.llm.cache_max_entries,
+            "methods": stats,
+        }
+
+# 创建全局AI缓存实例
+llm_cache = LLMResponseCache()
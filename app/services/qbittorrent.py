@@ -1,6 +1,8 @@
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Tuple
+from datetime import datetime
 import qbittorrentapi
 import os
+import logging
 from app.core.config import settings
 
 class QBittorrentClient:
@@ -42,32 +44,72 @@ class QBittorrentClient:
                 })
         return results
 
+    async def add_torrents(self, urls: List[str], save_path: Optional[str] = None) -> Optional[str]:
+        """一次请求添加多个种子，成功时返回None，失败时返回错误信息"""
+        try:
+            result = self.client.torrents_add(
+                urls=urls,
+                save_path=save_path,
+                use_auto_torrent_management=False,
+            )
+        except Exception as e:
+            return str(e) or type(e).__name__
+        # 旧版本返回"Ok."或"Fails."，5.1及以上版本返回包含成功和失败数量的JSON
+        if isinstance(result, dict):
+            if result.get("failure_count"):
+                return f"qBittorrent拒绝添加 {result['failure_count']} 个种子"
+            return None
+        if isinstance(result, str) and result.strip() == "Fails.":
+            return f"qBittorrent拒绝添加种子: {result}"
+        return None
+
+    def _torrent_to_info(self, torrent) -> Dict:
+        """将qBittorrent返回的种子转换为状态字典（不含文件列表）"""
+        return {
+            "hash": torrent.hash,
+            "name": torrent.name,
+            "size": torrent.size,
+            "progress": torrent.progress,
+            "state": torrent.state,
+            "save_path": torrent.save_path,
+            "content_path": torrent.content_path,
+        }
+
     async def get_torrent_info(self, torrent_hash: str) -> Optional[Dict]:
         """获取种子信息"""
         try:
             torrent = self.client.torrents_info(torrent_hashes=[torrent_hash])[0]
-            return {
-                "hash": torrent.hash,
-                "name": torrent.name,
-                "size": torrent.size,
-                "progress": torrent.progress,
-                "state": torrent.state,
-                "save_path": torrent.save_path,
-                "content_path": torrent.content_path,
-                "files": [
-                    {
-                        "name": f.name,
-                        "size": f.size,
-                        "progress": f.progress,
-                        "priority": f.priority,
-                        "is_seed": f.is_seed,
-                        "path": os.path.join(torrent.content_path, f.name)
-                    }
-                    for f in torrent.files
-                ]
-            }
+            info = self._torrent_to_info(torrent)
+            info["files"] = [
+                {
+                    "name": f.name,
+                    "size": f.size,
+                    "progress": f.progress,
+                    "priority": f.priority,
+                    "is_seed": f.is_seed,
+                    "path": os.path.join(torrent.content_path, f.name)
+                }
+                for f in torrent.files
+            ]
+            return info
         except Exception:
             return None
+
+    async def get_torrents_info(self, torrent_hashes: List[str], chunk_size: int = 200) -> Optional[Dict[str, Dict]]:
+        """批量获取种子状态（不含文件列表），返回 {小写hash: 状态字典}
+
+        按chunk_size分批调用torrents_info，请求失败时返回None
+        """
+        infos = {}
+        try:
+            for i in range(0, len(torrent_hashes), chunk_size):
+                chunk = torrent_hashes[i:i + chunk_size]
+                for torrent in self.client.torrents_info(torrent_hashes=chunk):
+                    infos[torrent.hash.lower()] = self._torrent_to_info(torrent)
+        except Exception as e:
+            logging.warning(f"批量获取种子信息失败: {str(e)}")
+            return None
+        return infos
     
     async def get_torrent_files(self, torrent_hash: str) -> List[Dict]:
         """获取种子文件列表"""
@@ -100,5 +142,97 @@ class QBittorrentClient:
         except Exception:
             return False
 
+class TorrentSyncEngine:
+    """基于qBittorrent sync/maindata接口的增量同步引擎
+
+    在内存中维护所有种子状态的镜像，每次只拉取自上次响应ID(rid)以来的变化，
+    并只返回关心的字段真正发生变化的种子
+    """
+    # 需要同步的字段，其他字段（速度、做种数等）的变化不视为状态变化
+    FIELDS = ("name", "size", "progress", "state", "save_path", "content_path")
+
+    def __init__(self, client: QBittorrentClient, resync_interval: int = 600):
+        self.client = client
+        # 定期强制全量同步，修正镜像与qBittorrent之间可能的偏差
+        self.resync_interval = resync_interval
+        self.rid = 0
+        self.torrents: Dict[str, Dict] = {}
+        self.last_full_sync: Optional[datetime] = None
+        # 每个种子上次同步后在数据库中的状态，用于发现其他地方（例如重新下载）修改的种子
+        self.checked_status: Dict[str, str] = {}
+
+    def reset(self):
+        """清空镜像，下次同步时重新全量拉取"""
+        self.rid = 0
+        self.torrents = {}
+        self.checked_status = {}
+
+    def stale_states(self, torrents: List) -> Dict[str, Dict]:
+        """数据库状态在上次同步之后被修改过的种子，返回 {小写hash: 镜像中的状态}
+
+        镜像中还没有的种子（例如刚重新添加到qBittorrent）等出现在增量中时再处理
+        """
+        states = {}
+        for torrent in torrents:
+            torrent_hash = torrent.hash.lower()
+            if self.checked_status.get(torrent_hash) != torrent.status and torrent_hash in self.torrents:
+                states[torrent_hash] = self.torrents[torrent_hash]
+        return states
+
+    def mark_checked(self, torrents: List):
+        """记录种子同步后在数据库中的状态"""
+        for torrent in torrents:
+            self.checked_status[torrent.hash.lower()] = torrent.status
+
+    async def sync(self) -> Optional[Tuple[Dict[str, Optional[Dict]], bool]]:
+        """拉取一次增量
+
+        Returns:
+            (变化的种子 {小写hash: 状态字典，已删除的种子为None}, 是否为全量同步)，
+            请求失败时返回None
+        """
+        if self.last_full_sync and \
+                (datetime.utcnow() - self.last_full_sync).total_seconds() >= self.resync_interval:
+            self.reset()
+
+        try:
+            data = self.client.client.sync_maindata(rid=self.rid)
+        except Exception as e:
+            logging.warning(f"qBittorrent增量同步失败: {str(e)}")
+            self.reset()
+            return None
+
+        full_update = bool(data.get("full_update"))
+        if full_update:
+            self.torrents = {}
+            self.last_full_sync = datetime.utcnow()
+
+        changed: Dict[str, Optional[Dict]] = {}
+        for torrent_hash, delta in (data.get("torrents") or {}).items():
+            torrent_hash = torrent_hash.lower()
+            state = self.torrents.get(torrent_hash)
+            if state is None:
+                state = {"hash": torrent_hash}
+                self.torrents[torrent_hash] = state
+                changed[torrent_hash] = state
+            for field in self.FIELDS:
+                if field in delta and state.get(field) != delta[field]:
+                    state[field] = delta[field]
+                    changed[torrent_hash] = state
+
+        for torrent_hash in data.get("torrents_removed") or []:
+            torrent_hash = torrent_hash.lower()
+            self.torrents.pop(torrent_hash, None)
+            changed[torrent_hash] = None
+
+        self.rid = data.get("rid", self.rid)
+
+        if full_update:
+            return dict(self.torrents), True
+        return changed, False
+
 # 创建全局客户端实例
-qbittorrent_client = QBittorrentClient()
\ No newline at end of file
+qbittorrent_client = QBittorrentClient()
+
+# 创建全局增量同步引擎
+torrent_sync = TorrentSyncEngine(qbittorrent_client, resync_interval=settings.scheduler.torrent_resync_interval)
\ No newline at end of file
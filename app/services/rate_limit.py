@@ -0,0 +1,68 @@
+from typing import Optional
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import asyncio
+import random
+import time
+
+class TokenBucket:
+    """令牌桶限速器，rate_per_minute为0时不限速
+
+    容量为每分钟的额度，令牌按固定速率补充；等待中的请求按先后顺序获取令牌。
+    """
+    def __init__(self, rate_per_minute: int):
+        self.capacity = float(rate_per_minute)
+        self.tokens = float(rate_per_minute)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.capacity / 60)
+        self.updated = now
+
+    async def acquire(self, amount: float = 1) -> float:
+        """获取amount个令牌，返回等待的时间（秒）"""
+        if self.capacity <= 0:
+            return 0.0
+        # 单次请求超过容量时按容量计算，否则永远无法获取
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return waited
+                delay = (amount - self.tokens) * 60 / self.capacity
+                await asyncio.sleep(delay)
+                waited += delay
+
+    def consume(self, amount: float):
+        """补记实际使用的额度（例如响应返回的token数多于预估），可以使余额为负"""
+        if self.capacity <= 0:
+            return
+        self._refill()
+        self.tokens -= amount
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """解析Retry-After响应头（秒数或HTTP日期），返回需要等待的秒数"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+def backoff_delay(attempt: int, base: float, maximum: float) -> float:
+    """第attempt次（从0开始）重试前的等待时间：指数退避加随机抖动"""
+    delay = min(maximum, base * (2 ** attempt))
+    return delay * random.uniform(0.5, 1.5)
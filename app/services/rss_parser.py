@@ -1,10 +1,16 @@
-from typing import List, Dict, Optional, Tuple
-import aiohttp
+from typing import Any, Hashable, List, Dict, Optional, Set, Tuple
 import re
-import xml.etree.ElementTree as ET
-from datetime import datetime
+from urllib.parse import quote
 from app.core.config import settings
+from app.services.bencode import TorrentMeta
+from app.services.feed_parsers import FeedEntry, iter_feed
+from app.services.http import http_sessions
+from app.services.seen_items import seen_items
+from app.services.torrent_cache import torrent_cache
+import asyncio
+import hashlib
 import logging
+import time
 
 class RSSParser:
     def __init__(self):
@@ -15,79 +21,130 @@ class RSSParser:
             self.proxy = settings.general.http_proxy[0]
         else:
             self.proxy = None
+        # 条件请求校验信息 {键: {"etag", "last_modified", "content_hash"}}，键默认为URL
+        self._validators: Dict[Hashable, Dict[str, Optional[str]]] = {}
+        # 正在进行的请求，相同的请求只发送一次 {(url, etag, last_modified): task}
+        self._fetches: Dict[Tuple, asyncio.Task] = {}
 
-    async def _fetch_content(self, url: str) -> Optional[str]:
-        """获取内容"""
+    async def _fetch_content(self, url: str) -> Optional[bytes]:
+        """获取内容（响应的原始字节）"""
+        result = await self._fetch_feed(url)
+        if result["error"]:
+            logging.warning(f"获取 {url} 失败: {result['error']}")
+        return result["content"]
+
+    async def _fetch_feed(self, url: str, cached: Optional[Dict[str, Optional[str]]] = None) -> Dict:
+        """获取RSS内容，cached不为空时使用其中的ETag/Last-Modified发送条件请求
+
+        并发的相同请求（URL和条件请求头都相同）合并为一次，所有调用方共享同一个结果，调用方不能修改结果。
+        Returns:
+            {"status": HTTP状态码, "content": 响应的原始字节, "not_modified": 是否返回304,
+             "validators": 本次响应的校验信息, "error": 错误信息}
+        """
+        headers = dict(self.headers)
+        if cached:
+            if cached.get("etag"):
+                headers["If-None-Match"] = cached["etag"]
+            if cached.get("last_modified"):
+                headers["If-Modified-Since"] = cached["last_modified"]
+
+        key = (url, headers.get("If-None-Match"), headers.get("If-Modified-Since"))
+        task = self._fetches.get(key)
+        if task is None:
+            task = asyncio.create_task(self._request_feed(url, headers))
+            self._fetches[key] = task
+            task.add_done_callback(lambda _: self._fetches.pop(key, None))
+        # 某个调用方被取消时不影响其他等待同一请求的调用方
+        return await asyncio.shield(task)
+
+    async def _request_feed(self, url: str, headers: Dict[str, str]) -> Dict:
+        """发送RSS请求"""
+        result = {
+            "status": None, "content": None, "not_modified": False, "validators": None, "error": None,
+            "bytes": None, "fetch_ms": None
+        }
+        started = time.monotonic()
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(
-                    url,
-                    headers=self.headers,
-                    proxy=self.proxy,
-                    timeout=30
-                ) as response:
-                    if response.status != 200:
-                        return None
-                    return await response.text()
-        except Exception:
-            return None
+            async with http_sessions.get("rss").get(
+                url,
+                headers=headers,
+                proxy=self.proxy
+            ) as response:
+                result["status"] = response.status
+                if response.status == 304:
+                    result["not_modified"] = True
+                    return result
+                if response.status != 200:
+                    result["error"] = f"HTTP {response.status}"
+                    return result
+                body = await response.read()
+                result["bytes"] = len(body)
+                result["validators"] = {
+                    "etag": response.headers.get("ETag"),
+                    "last_modified": response.headers.get("Last-Modified"),
+                    "content_hash": hashlib.sha1(body).hexdigest()
+                }
+                # 不在这里解码，由解析器根据XML声明识别编码
+                result["content"] = body
+                return result
+        except Exception as e:
+            result["error"] = str(e) or type(e).__name__
+            return result
+        finally:
+            result["fetch_ms"] = (time.monotonic() - started) * 1000
 
-    async def _download_torrent(self, url: str) -> Optional[str]:
-        """下载种子文件并提取磁力链接"""
+    async def _download_torrent(self, url: str) -> Optional[Dict[str, Any]]:
+        """下载并解析种子文件"""
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(
-                    url,
-                    headers=self.headers,
-                    proxy=self.proxy,
-                    timeout=30
-                ) as response:
-                    if response.status != 200:
-                        return None
-                    content = await response.read()
-                    # 解析种子文件
-                    import bencodepy
-                    torrent = bencodepy.decode(content)
-                    info = torrent[b'info']
-                    
-                    # 生成 info_hash
-                    import hashlib
-                    info_hash = hashlib.sha1(bencodepy.encode(info)).hexdigest()
-                    
-                    # 构建基础磁力链接
-                    magnet = f"magnet:?xt=urn:btih:{info_hash}"
-                    
-                    # 添加显示名称
-                    if b'name' in info:
-                        from urllib.parse import quote
-                        name = info[b'name'].decode('utf-8', errors='ignore')
-                        magnet += f"&dn={quote(name)}"
-                    
-                    # 添加 tracker
-                    if b'announce' in torrent:
-                        tracker = torrent[b'announce'].decode('utf-8', errors='ignore')
-                        magnet += f"&tr={quote(tracker)}"
-                    
-                    # 添加备用 tracker 列表
-                    if b'announce-list' in torrent:
-                        for tracker in torrent[b'announce-list']:
-                            if isinstance(tracker, list):
-                                tracker = tracker[0]
-                            tracker_str = tracker.decode('utf-8', errors='ignore')
-                            magnet += f"&tr={quote(tracker_str)}"
-                    
-                    # 添加 DHT 节点
-                    if b'nodes' in torrent:
-                        for node in torrent[b'nodes']:
-                            if isinstance(node, list) and len(node) >= 2:
-                                host = node[0].decode('utf-8', errors='ignore')
-                                port = str(node[1])
-                                magnet += f"&dht={quote(host)}:{port}"
-                    
-                    return magnet
+            async with http_sessions.get("rss").get(
+                url,
+                headers=self.headers,
+                proxy=self.proxy
+            ) as response:
+                if response.status != 200:
+                    return None
+                content = await response.read()
+            return self._parse_torrent(content)
         except Exception:
             return None
 
+    def _parse_torrent(self, content: bytes) -> Dict[str, Any]:
+        """解析种子文件，返回 {"info_hash", "magnet", "name", "files"}"""
+        meta = TorrentMeta(content)
+
+        # 构建基础磁力链接，v2种子同时带上btmh（SHA-256多哈希格式）
+        xts = []
+        if meta.info_hash_v1:
+            xts.append(f"xt=urn:btih:{meta.info_hash_v1}")
+        if meta.info_hash_v2:
+            xts.append(f"xt=urn:btmh:1220{meta.info_hash_v2}")
+        magnet = "magnet:?" + "&".join(xts)
+
+        # 添加显示名称
+        name = meta.name
+        if name is not None:
+            magnet += f"&dn={quote(name)}"
+
+        # 添加 tracker
+        for tracker in meta.trackers:
+            magnet += f"&tr={quote(tracker)}"
+
+        # 添加 DHT 节点
+        for host, port in meta.nodes:
+            magnet += f"&dht={quote(host)}:{port}"
+
+        return {"info_hash": meta.info_hash, "magnet": magnet, "name": name, "files": meta.files}
+
+    async def _resolve_torrent(self, url: str) -> Optional[Dict[str, Any]]:
+        """获取种子文件的解析结果，优先使用缓存，只有未缓存的链接才下载"""
+        torrent = await torrent_cache.get(url)
+        if torrent is not None:
+            return torrent
+        torrent = await self._download_torrent(url)
+        if torrent is not None:
+            await torrent_cache.put(url, torrent)
+        return torrent
+
     def _extract_magnet(self, content: str) -> Tuple[Optional[str], Optional[str]]:
         """从内容中提取磁力链接和哈希值"""
         # 匹配磁力链接以及其携带的信息 (dn, dht, tr, etc.)
@@ -107,37 +164,17 @@ class RSSParser:
             return match.group(0)
         return None
 
-    def _parse_date(self, date_str: str) -> Optional[datetime]:
-        """解析日期字符串"""
-        try:
-            from email.utils import parsedate_to_datetime
-            return parsedate_to_datetime(date_str)
-        except Exception:
-            return None
-    
     async def parse_feed_first_item(self, url: str) -> Optional[Dict]:
         content = await self._fetch_content(url)
         if not content:
             return None
         
         try:
-            root = ET.fromstring(content)
-            items = root.findall(".//item")
-            if not items or len(items) == 0:
-                return None
-            
-            # 提取第一个条目
-            item = items[0]
-            result = {
-                "title": None
-            }
-
-            # 提取标题
-            title_elem = item.find("title")
-            if title_elem is not None and title_elem.text:
-                result["title"] = title_elem.text.strip()
-
-            return result
+            for kind, value in iter_feed(content):
+                # 只提取第一个条目的标题
+                if kind == "item":
+                    return {"title": value.info["title"]}
+            return None
         except Exception:
             return None
 
@@ -148,79 +185,126 @@ class RSSParser:
             return None, []
 
         try:
-            # 解析XML
-            root = ET.fromstring(content)
-            
-            # 提取RSS标题
-            feed_title = None
-            channel = root.find(".//channel")
-            if channel is not None:
-                title_elem = channel.find("title")
-                if title_elem is not None and title_elem.text:
-                    feed_title = title_elem.text.strip()
-            
-            # 查找所有项目
-            items = root.findall(".//item")
-            results = []
-            
-            for item in items:
-                # 基本信息
-                result = {
-                    "title": None,
-                    "link": None,
-                    "published": None,
-                    "magnet": None,
-                    "hash": None
-                }
-                
-                # 提取标题
-                title_elem = item.find("title")
-                if title_elem is not None and title_elem.text:
-                    result["title"] = title_elem.text.strip()
-                
-                # 提取链接
-                link_elem = item.find("link")
-                if link_elem is not None and link_elem.text:
-                    result["link"] = link_elem.text.strip()
-                
-                # 提取发布日期
-                date_elem = item.find("pubDate")
-                if date_elem is not None and date_elem.text:
-                    result["published"] = self._parse_date(date_elem.text.strip())
-                
-                # 提取磁力链接或种子文件
-                # 1. 从所有可能的字段中提取磁力链接
-                for elem in item:
-                    if elem.text:
-                        magnet, hash_value = self._extract_magnet(elem.text)
-                        if magnet:
-                            logging.info(f"Magnet: {magnet}")
-                            result["magnet"] = magnet
-                            result["hash"] = hash_value
-                            break
-                
-                # 2. 如果没有磁力链接，尝试下载种子文件
-                if not result["magnet"]:
-                    # convert item to text
-                    item_text = ET.tostring(item, encoding='utf-8', method='xml').decode('utf-8')
-                    torrent_url = self._extract_torrent_url(item_text)
-                    if torrent_url:
-                        magnet = await self._download_torrent(torrent_url)
-                        if magnet:
-                            result["magnet"] = magnet
-                            # 从磁力链接中提取哈希值
-                            hash_match = re.search(r'btih:([a-zA-Z0-9]+)', magnet)
-                            if hash_match:
-                                result["hash"] = hash_match.group(1)
-                
-                # 只添加有标题和磁力链接的条目
-                if result["title"] and result["magnet"]:
-                    results.append(result)
-            
-            return feed_title, results
+            return await self._parse_content(content)
         except Exception:
             return None, []
 
+    async def poll_feed(
+        self,
+        url: str,
+        conditional: bool = True,
+        seen: Optional[Set[str]] = None,
+        stop_at_seen: bool = True,
+        validator_keys: Optional[List[Hashable]] = None
+    ) -> Dict:
+        """定时检查RSS源
+
+        使用条件请求，内容未变化时不解析；内容变化时只解析到第一个已处理的条目为止。
+        validator_keys为保存校验信息的键，默认为URL；多个RSS源共用一个地址时每个源使用自己的键，
+        只有所有键的校验信息相同（都处理过同一版本的内容）时才发送条件请求。
+        本方法不保存校验信息，调用方处理完条目后用commit_validators保存返回的validators，
+        处理失败时不保存，下次检查会重新获取完整内容。
+        Returns:
+            {"title": RSS标题, "items": 条目列表, "not_modified": 内容是否未变化, "error": 错误信息,
+             "validators": 本次响应的校验信息（未获取到新内容时为None）,
+             "status": HTTP状态码, "bytes": 内容大小, "fetch_ms": 抓取耗时, "parse_ms": 解析耗时（包括下载种子文件）}
+        """
+        keys = validator_keys or [url]
+        cached = None
+        if conditional:
+            cached = self._validators.get(keys[0])
+            if any(self._validators.get(key) != cached for key in keys[1:]):
+                cached = None
+
+        fetched = await self._fetch_feed(url, cached)
+        result = {
+            "title": None, "items": [], "not_modified": fetched["not_modified"], "error": fetched["error"],
+            "validators": None, "status": fetched["status"], "bytes": fetched["bytes"], "fetch_ms": fetched["fetch_ms"], "parse_ms": None
+        }
+        if fetched["not_modified"] or fetched["error"]:
+            return result
+
+        # 服务器不支持条件请求时，通过内容哈希判断是否变化
+        if cached and cached.get("content_hash") == fetched["validators"]["content_hash"]:
+            result["not_modified"] = True
+            result["validators"] = fetched["validators"]
+            return result
+
+        started = time.monotonic()
+        try:
+            result["title"], result["items"] = await self._parse_content(
+                fetched["content"], seen=seen, stop_at_seen=stop_at_seen
+            )
+        except Exception as e:
+            result["error"] = f"解析失败: {str(e)}"
+            return result
+        finally:
+            result["parse_ms"] = (time.monotonic() - started) * 1000
+
+        result["validators"] = fetched["validators"]
+        return result
+
+    def commit_validators(self, keys: List[Hashable], validators: Optional[Dict[str, Optional[str]]]):
+        """保存poll_feed返回的校验信息，应在条目处理成功后调用，避免处理失败的内容被当作未变化跳过"""
+        if not validators:
+            return
+        for key in keys:
+            self._validators[key] = validators
+
+    def _extract_entry_magnet(self, entry: FeedEntry, result: Dict) -> Optional[str]:
+        """从条目中提取磁力链接写入result，没有磁力链接时返回种子文件链接"""
+        # 从所有可能的字段中提取磁力链接
+        for text in entry.texts():
+            magnet, hash_value = self._extract_magnet(text)
+            if magnet:
+                logging.info(f"Magnet: {magnet}")
+                result["magnet"] = magnet
+                result["hash"] = hash_value
+                return None
+
+        return self._extract_torrent_url(entry.raw())
+
+    async def _parse_content(
+        self,
+        content: bytes,
+        seen: Optional[Set[str]] = None,
+        stop_at_seen: bool = True
+    ) -> Tuple[Optional[str], List[Dict]]:
+        """解析RSS/Atom/JSON Feed内容，返回(标题, 条目列表)，解析失败时抛出异常
+
+        seen为RSS源已处理过的条目索引（见seen_items），已处理过的条目不再提取磁力链接或下载种子文件。
+        RSS条目按时间从新到旧排列，stop_at_seen为True时遇到第一个已处理过的条目即停止解析。
+        """
+        feed_title = None
+        results = []
+
+        for kind, value in iter_feed(content):
+            if kind == "title":
+                feed_title = feed_title or value
+                continue
+
+            # 先用GUID/链接判断，未处理过的条目才提取磁力链接或下载种子文件
+            result = dict(value.info)
+            if not seen_items.is_seen(result, seen):
+                torrent_url = self._extract_entry_magnet(value, result)
+                if torrent_url:
+                    torrent = await self._resolve_torrent(torrent_url)
+                    if torrent:
+                        result["magnet"] = torrent["magnet"]
+                        result["hash"] = torrent["info_hash"]
+
+            if seen_items.is_seen(result, seen):
+                if stop_at_seen:
+                    logging.info(f"遇到已处理的条目 {result['title']}，停止解析")
+                    break
+                continue
+
+            # 只添加有标题和磁力链接的条目
+            if result["title"] and result["magnet"]:
+                results.append(result)
+
+        return feed_title, results
+
     async def validate_feed(self, url: str) -> bool:
         """验证RSS源是否有效"""
         content = await self._fetch_content(url)
@@ -228,9 +312,7 @@ class RSSParser:
             return False
             
         try:
-            root = ET.fromstring(content)
-            items = root.findall(".//item")
-            return len(items) > 0
+            return any(kind == "item" for kind, _ in iter_feed(content))
         except Exception:
             return False
 
@@ -241,15 +323,9 @@ class RSSParser:
             return None
 
         try:
-            # 解析XML
-            root = ET.fromstring(content)
-            
-            # 提取RSS标题
-            channel = root.find(".//channel")
-            if channel is not None:
-                title_elem = channel.find("title")
-                if title_elem is not None and title_elem.text:
-                    return title_elem.text.strip()
+            for kind, value in iter_feed(content):
+                if kind == "title":
+                    return value
             return None
         except Exception:
             return None
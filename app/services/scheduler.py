@@ -1,99 +1,429 @@
-from datetime import datetime
+from datetime import datetime, timedelta
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional, Set, Tuple
+from urllib.parse import urlparse, urlunparse
+from apscheduler.events import EVENT_JOB_MAX_INSTANCES
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.interval import IntervalTrigger
-from sqlalchemy.ext.asyncio import AsyncSession
 from app.db.session import async_session
 from app.crud.source import source
 from app.services.rss_parser import rss_parser
+from app.services.cadence import cadence_planner
 from app.services.download_manager import download_manager
-from app.services.qbittorrent import qbittorrent_client
+from app.services.job_queue import job_queue
+from app.services.leader import leader_election
+from app.services.qbittorrent import qbittorrent_client, torrent_sync
+from app.services.seen_items import seen_items
+from app.services.feed_stats import feed_stats
+from app.core.config import settings
 
+import asyncio
+import heapq
 import logging
+import time
+
+def normalize_feed_url(url: str) -> str:
+    """规范化RSS地址，用于判断多个源是否订阅同一个地址"""
+    parsed = urlparse(url.strip())
+    scheme = parsed.scheme.lower()
+    netloc = (parsed.hostname or "").lower()
+    if parsed.port and (scheme, parsed.port) not in (("http", 80), ("https", 443)):
+        netloc += f":{parsed.port}"
+    if parsed.username:
+        userinfo = parsed.username + (f":{parsed.password}" if parsed.password else "")
+        netloc = f"{userinfo}@{netloc}"
+    return urlunparse((scheme, netloc, parsed.path or "/", parsed.params, parsed.query, ""))
+
+class JobMetrics:
+    """单个定时任务的运行统计"""
+    def __init__(self):
+        self.runs = 0
+        self.failures = 0
+        self.skipped = 0  # 因上一次运行尚未结束而跳过的次数
+        self.last_duration: Optional[float] = None
+        self.max_duration = 0.0
+        self.total_duration = 0.0
+        self.last_run_at: Optional[datetime] = None
+
+    def record(self, duration: float):
+        """记录一次运行耗时"""
+        self.runs += 1
+        self.last_duration = duration
+        self.max_duration = max(self.max_duration, duration)
+        self.total_duration += duration
+        self.last_run_at = datetime.utcnow()
+
+    def dict(self) -> Dict[str, Any]:
+        return {
+            "runs": self.runs,
+            "failures": self.failures,
+            "skipped": self.skipped,
+            "last_duration": self.last_duration,
+            "max_duration": self.max_duration,
+            "avg_duration": self.total_duration / self.runs if self.runs else None,
+            "last_run_at": self.last_run_at,
+        }
 
 class Scheduler:
     def __init__(self):
         self.scheduler = AsyncIOScheduler()
-        self.is_checking = False
+        self.scheduler.add_listener(self._on_job_skipped, EVENT_JOB_MAX_INSTANCES)
+        # 数据库写入串行化，抓取可以并发但AsyncSession不能并发使用
+        self._db_lock = asyncio.Lock()
+        # 每个主机一个信号量，限制同一主机的并发连接数
+        self._host_semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._rss_semaphore = asyncio.Semaphore(settings.scheduler.rss_concurrency)
+        # RSS源到期时间的小顶堆 (next_check_at, source_id)，过期条目通过_due_at惰性丢弃
+        self._due_heap: List[Tuple[datetime, int]] = []
+        self._due_at: Dict[int, datetime] = {}
+        # 正在检查的RSS源，检查结束后才会重新加入堆
+        self._rss_in_flight: Set[int] = set()
+        self._wakeup = asyncio.Event()
+        self._dispatcher_task: Optional[asyncio.Task] = None
+        self._rss_tasks: Set[asyncio.Task] = set()
+        self._leader_task: Optional[asyncio.Task] = None
+        self.metrics: Dict[str, JobMetrics] = {
+            "check_rss_sources": JobMetrics(),
+            "reconcile_rss_schedule": JobMetrics(),
+            "update_torrents": JobMetrics(),
+        }
         self._setup_jobs()
 
     def _setup_jobs(self):
-        """设置定时任务"""
-        # 每分钟检查一次是否有需要更新的RSS源
+        """设置定时任务
+
+        RSS抓取由_run_rss_dispatcher按到期时间调度，这里的任务各自独立运行：
+        - update_torrents: 同步种子状态
+        - reconcile_rss_schedule: 从数据库重新加载RSS检查计划，兜底其他进程或手动修改的数据
+        两个任务都不允许重叠运行，上一次未结束时跳过本次并计入skipped
+        """
+        config = settings.scheduler
         self.scheduler.add_job(
-            self._check_rss_sources,
-            IntervalTrigger(seconds=60),
-            id='check_rss_sources',
+            self._update_torrents,
+            IntervalTrigger(seconds=config.torrent_sync_interval),
+            id='update_torrents',
+            max_instances=1,
+            coalesce=True,
+            misfire_grace_time=config.torrent_sync_interval,
+            replace_existing=True
+        )
+        self.scheduler.add_job(
+            self._reconcile_rss_schedule,
+            IntervalTrigger(seconds=config.rss_reconcile_interval),
+            id='reconcile_rss_schedule',
+            max_instances=1,
+            coalesce=True,
+            misfire_grace_time=config.rss_reconcile_interval,
             replace_existing=True
         )
 
-    async def _check_rss_sources(self):
-        """检查所有需要更新的RSS源"""
-        if self.is_checking:
-            return
-        self.is_checking = True
+    def _on_job_skipped(self, event):
+        """上一次运行尚未结束，本次运行被跳过"""
+        metrics = self.metrics.get(event.job_id)
+        if metrics:
+            metrics.skipped += 1
+        logging.warning(f"任务 {event.job_id} 上一次运行尚未结束，跳过本次运行")
+
+    @asynccontextmanager
+    async def _track(self, name: str):
+        """记录一次任务运行的耗时和失败次数"""
+        metrics = self.metrics[name]
+        started = time.monotonic()
         try:
-            logging.info("开始检查RSS源")
-            async with async_session() as db:
-                # 获取所有活跃的RSS源
-                sources = await source.get_active_rss_sources(db)
-                
-                for src in sources:
-                    # 检查是否需要更新
-                    if not src.last_check or \
-                    (datetime.utcnow() - src.last_check).total_seconds() >= src.check_interval:
-                        await self._process_rss_source(db, src)
-            
+            yield
+        except Exception:
+            metrics.failures += 1
+            raise
+        finally:
+            duration = time.monotonic() - started
+            metrics.record(duration)
+            logging.info(f"任务 {name} 运行结束，耗时 {duration:.2f} 秒")
+
+    def get_metrics(self) -> Dict[str, Dict[str, Any]]:
+        """获取所有任务的运行统计"""
+        return {name: metrics.dict() for name, metrics in self.metrics.items()}
+
+    async def _update_torrents(self):
+        """更新所有未完成种子的状态"""
+        async with self._track("update_torrents"):
             logging.info("开始更新下载中种子状态")
             async with async_session() as db:
                 # 更新下载中的种子状态
                 torrents = await download_manager.get_torrents_need_update(db)
-                for torrent in torrents:
-                    logging.info(f"检查种子 {torrent.hash} 状态")
-                    info = await qbittorrent_client.get_torrent_info(torrent.hash)
-                    await download_manager.update_torrent_status(db, torrent.id, info)
+                if not torrents:
+                    return
+
+                # 优先使用增量同步，只处理状态发生变化的种子
+                changes = await torrent_sync.sync()
+                if changes is None:
+                    # 增量同步失败时退回到一次批量请求获取所有种子状态
+                    infos = await qbittorrent_client.get_torrents_info([t.hash for t in torrents])
+                    if infos is None:
+                        # qBittorrent不可用时不修改任何种子状态，等待下次更新
+                        return
+                else:
+                    infos, full_update = changes
+                    if not full_update:
+                        # 除了qBittorrent中变化的种子，还要处理数据库状态被其他地方修改过的种子
+                        infos = dict(torrent_sync.stale_states(torrents), **infos)
+                        torrents = [t for t in torrents if t.hash.lower() in infos]
+                    if not torrents:
+                        return
+                await download_manager.update_torrents_status(db, torrents, infos)
+                torrent_sync.mark_checked(torrents)
+
+    async def _reconcile_rss_schedule(self):
+        """用数据库中的检查计划校正内存中的堆"""
+        async with self._track("reconcile_rss_schedule"):
+            async with async_session() as db:
+                schedule = dict(await source.get_rss_schedule(db))
+            # 已删除或暂停的源，丢弃其堆条目
+            for source_id in list(self._due_at):
+                if source_id not in schedule:
+                    del self._due_at[source_id]
+            # 新增或被提前的源
+            for source_id, next_check_at in schedule.items():
+                if source_id in self._rss_in_flight:
+                    continue
+                current = self._due_at.get(source_id)
+                if current is None or (next_check_at or datetime.min) < current:
+                    self.schedule_source(source_id, next_check_at)
+
+    def schedule_source(self, source_id: int, when: Optional[datetime] = None):
+        """安排RSS源在指定时间检查，默认立即检查"""
+        when = when or datetime.utcnow()
+        self._due_at[source_id] = when
+        heapq.heappush(self._due_heap, (when, source_id))
+        self._wakeup.set()
+
+    def _pop_due_source_ids(self, now: datetime) -> List[int]:
+        """弹出所有已到期的RSS源ID"""
+        source_ids = []
+        while self._due_heap and self._due_heap[0][0] <= now:
+            when, source_id = heapq.heappop(self._due_heap)
+            if self._due_at.get(source_id) != when:
+                # 该源已被重新调度，丢弃旧条目
+                continue
+            del self._due_at[source_id]
+            source_ids.append(source_id)
+        return source_ids
+
+    async def _load_rss_schedule(self):
+        """启动时从数据库加载所有RSS源的下次检查时间"""
+        async with async_session() as db:
+            schedule = await source.get_rss_schedule(db)
+        for source_id, next_check_at in schedule:
+            self.schedule_source(source_id, next_check_at)
+        logging.info(f"已加载 {len(schedule)} 个RSS源的检查计划")
+
+    def _log_task_exception(self, task: asyncio.Task):
+        """后台任务结束时记录未处理的异常"""
+        if task.cancelled():
+            return
+        error = task.exception()
+        if error is not None:
+            logging.error(f"后台任务 {task.get_name()} 异常退出: {error!r}", exc_info=error)
+
+    async def _run_rss_dispatcher(self):
+        """按到期时间调度RSS源检查，睡眠到下一个源到期为止"""
+        # 加载失败时重试，避免主进程在整个任期内都不检查RSS源
+        while True:
+            try:
+                await self._load_rss_schedule()
+                break
+            except Exception as e:
+                logging.error(f"加载RSS检查计划失败，{settings.scheduler.rss_retry_interval} 秒后重试: {str(e)}")
+                await asyncio.sleep(settings.scheduler.rss_retry_interval)
+
+        while True:
+            try:
+                self._wakeup.clear()
+                now = datetime.utcnow()
+                source_ids = self._pop_due_source_ids(now)
+                # 仍在检查中的源等检查结束后会重新加入堆
+                source_ids = [source_id for source_id in source_ids if source_id not in self._rss_in_flight]
+                if source_ids:
+                    task = asyncio.create_task(self._check_rss_sources(source_ids), name="check_rss_sources")
+                    self._rss_tasks.add(task)
+                    task.add_done_callback(self._rss_tasks.discard)
+                    task.add_done_callback(self._log_task_exception)
+                    continue
+
+                timeout = None
+                if self._due_heap:
+                    timeout = max((self._due_heap[0][0] - now).total_seconds(), 0)
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"RSS调度出错，{settings.scheduler.rss_retry_interval} 秒后继续: {str(e)}")
+                await asyncio.sleep(settings.scheduler.rss_retry_interval)
+
+    async def _check_rss_sources(self, source_ids: List[int]):
+        """检查一批已到期的RSS源"""
+        self._rss_in_flight.update(source_ids)
+        try:
+            async with self._track("check_rss_sources"):
+                logging.info(f"开始检查 {len(source_ids)} 个RSS源")
+                async with async_session() as db:
+                    # 只加载到期的RSS源
+                    sources = await source.get_rss_sources_by_ids(db, ids=source_ids)
+                # 一次性加载本轮所有源的已处理条目索引
+                index = await seen_items.load(src.id for src in sources)
+
+                # 同一个RSS地址只抓取一次，结果分发给所有订阅该地址的源
+                groups: Dict[str, List] = {}
+                for src in sources:
+                    groups.setdefault(normalize_feed_url(src.url), []).append(src)
+
+                # 并发抓取，整轮耗时取决于最慢的源而不是所有源之和
+                await asyncio.gather(*(self._process_feed_group(url, group, index) for url, group in groups.items()))
         finally:
-            self.is_checking = False
-        
+            self._rss_in_flight.difference_update(source_ids)
+
+    def _host_semaphore(self, url: str) -> asyncio.Semaphore:
+        """获取URL所在主机的信号量"""
+        host = urlparse(url).hostname or ""
+        semaphore = self._host_semaphores.get(host)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(settings.scheduler.rss_per_host_limit)
+            self._host_semaphores[host] = semaphore
+        return semaphore
 
-    async def _process_rss_source(self, db: AsyncSession, src):
-        """处理单个RSS源的更新"""
+    async def _process_feed_group(self, url: str, group: List, index: Dict[int, Set[str]]):
+        """抓取一次RSS地址，将结果分发给所有订阅该地址的源"""
+        # 所有源都处理过的条目才能停止解析，其余条目按各自的索引过滤
+        seen = set.intersection(*(index[src.id] for src in group))
         try:
-            # 解析RSS源
-            feed_title, items = await rss_parser.parse_feed(src.url)
-            if not items:
-                return
-
-            # 更新最后检查时间
-            await source.update_last_check(db, db_obj=src)
-
-            # 处理新的种子
-            for item in items:
-                # 检查是否已经下载过
-                if not await download_manager.is_downloaded(item["hash"]):
-                    # 创建新的下载任务
-                    await download_manager.create_download(
-                        source_id=src.id,
-                        title=item["title"],
-                        url=item["magnet"],  # 使用磁力链接
-                        hash=item["hash"]
-                    )
+            # 先占用主机名额再占用全局名额，避免排队等待同一主机时占着全局名额
+            async with self._host_semaphore(url), self._rss_semaphore:
+                # 新添加或被重置的源（next_check_at为空）不使用条件请求，确保完整处理一次
+                feed = await rss_parser.poll_feed(
+                    url,
+                    conditional=all(src.next_check_at is not None for src in group),
+                    seen=seen,
+                    stop_at_seen=settings.scheduler.rss_stop_at_known,
+                    validator_keys=[src.id for src in group]
+                )
+        except Exception as e:
+            feed = {"title": None, "items": [], "not_modified": False, "error": str(e) or type(e).__name__}
+        if len(group) > 1:
+            logging.info(f"RSS地址 {url} 由 {len(group)} 个源共享，只抓取一次")
+        await asyncio.gather(*(self._process_rss_source(src, index[src.id], feed) for src in group))
+
+    async def _process_rss_source(self, src, seen: Set[str], feed: Dict[str, Any]):
+        """处理单个RSS源的抓取结果，seen为该源已处理过的条目索引"""
+        # 抓取失败时按重试间隔再次检查
+        next_check_at = datetime.utcnow() + timedelta(seconds=settings.scheduler.rss_retry_interval)
+        new_count = 0
+        error = None
+        try:
+            # 共享的抓取结果中可能包含该源已经处理过的条目
+            items = [item for item in feed["items"] if not seen_items.is_seen(item, seen)]
+
+            async with self._db_lock:
+                if feed["error"]:
+                    logging.warning(f"抓取RSS源 {src.url} 失败: {feed['error']}")
+                    async with async_session() as db:
+                        await source.update_next_check(db, db_obj=src, next_check_at=next_check_at)
+                    return
+                if feed["not_modified"]:
+                    logging.info(f"RSS源 {src.url} 内容未变化")
+
+                # 批量添加新的种子，其他RSS源已经添加过的种子会被跳过
+                added = await download_manager.ingest_items(src.id, items)
+                new_count = len(added)
+                # 记录本次处理过的条目，之后的检查直接跳过
+                await seen_items.add(src.id, items, seen)
+
+                async with async_session() as db:
+                    # 更新最后检查时间
+                    src = await source.update_last_check(db, db_obj=src)
+                    if settings.scheduler.adaptive_polling:
+                        # 根据发布规律调整下次检查时间
+                        updates = cadence_planner.plan(
+                            src,
+                            [item["published"] for item in items],
+                            new_count > 0
+                        )
+                        src = await source.update(db, db_obj=src, obj_in=updates)
+                    next_check_at = src.next_check_at
+                # 条目都已处理，之后内容未变化时可以跳过
+                rss_parser.commit_validators([src.id], feed.get("validators"))
         except Exception as e:
             # 记录错误但不中断其他源的处理
-            logging.warning(f"处理RSS源 {src.url} 时出错: {str(e)}")
+            error = str(e) or type(e).__name__
+            logging.warning(f"处理RSS源 {src.url} 时出错: {error}")
+        finally:
+            try:
+                await feed_stats.record(src.id, feed, new_count=new_count, error=error)
+            except Exception as e:
+                logging.warning(f"记录RSS源 {src.url} 的抓取统计失败: {str(e)}")
+            if next_check_at is not None:
+                self.schedule_source(src.id, next_check_at)
+            else:
+                logging.info(f"RSS源 {src.url} 已暂停，不再自动检查")
 
     def start(self):
-        """启动调度器"""
-        self.scheduler.start()
+        """启动调度器，只有获得调度租约的进程才会运行后台任务"""
+        self.scheduler.start(paused=True)
+        self._leader_task = asyncio.create_task(
+            leader_election.run(self._on_elected, self._on_demoted)
+        )
+
+    async def _on_elected(self):
+        """成为主进程，开始运行后台任务"""
+        logging.info("开始运行后台任务")
+        # 其他进程的镜像和检查计划可能已经过期，重新全量加载
+        torrent_sync.reset()
+        self.scheduler.resume()
+        self._dispatcher_task = asyncio.create_task(self._run_rss_dispatcher(), name="rss_dispatcher")
+        self._dispatcher_task.add_done_callback(self._log_task_exception)
+        await job_queue.start(settings.scheduler.job_workers)
 
-    def shutdown(self):
-        """关闭调度器"""
+    async def _on_demoted(self):
+        """失去主进程身份，停止所有后台任务"""
+        logging.info("停止运行后台任务")
+        self.scheduler.pause()
+        self._stop_background_tasks()
+
+    def _stop_background_tasks(self):
+        """停止RSS调度和任务队列"""
+        job_queue.stop()
+        if self._dispatcher_task:
+            self._dispatcher_task.cancel()
+            self._dispatcher_task = None
+        for task in list(self._rss_tasks):
+            task.cancel()
+        self._due_heap = []
+        self._due_at = {}
+        self._rss_in_flight = set()
+
+    async def shutdown(self):
+        """关闭调度器并释放调度租约"""
+        if self._leader_task:
+            self._leader_task.cancel()
+            self._leader_task = None
         self.scheduler.shutdown()
-    
-    async def manual_check(self):
-        """手动触发一次RSS源检查"""
+        self._stop_background_tasks()
+        if leader_election.is_leader:
+            await leader_election.release()
+
+    async def manual_check(self, source_id: Optional[int] = None):
+        """手动触发RSS源检查，不指定source_id时检查所有RSS源"""
         logging.info("手动触发一次RSS源检查")
-        self.scheduler.pause_job('check_rss_sources')
-        await self._check_rss_sources()
-        self.scheduler.resume_job('check_rss_sources')
+        if not leader_election.is_leader:
+            # 由主进程的reconcile_rss_schedule任务从数据库中读取新的检查计划
+            return
+        if source_id is not None:
+            self.schedule_source(source_id)
+            return
+        async with async_session() as db:
+            schedule = await source.get_rss_schedule(db)
+        for schedule_source_id, _ in schedule:
+            self.schedule_source(schedule_source_id)
 
-scheduler = Scheduler() 
\ No newline at end of file
+scheduler = Scheduler()
@@ -0,0 +1,79 @@
+from typing import Dict, Iterable, List, Optional, Set
+from sqlalchemy import select, delete
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from app.core.config import settings
+from app.db.session import async_session
+from app.models.database import SeenItem
+
+class SeenItemIndex:
+    """每个RSS源已处理过的条目索引
+
+    索引中保存条目的GUID（没有GUID时为链接）和种子哈希（小写），
+    解析RSS时先用GUID/链接判断，已处理过的条目不再提取磁力链接或下载种子文件。
+    每个源只保留最近写入的seen_items_per_source条记录，早已从RSS中消失的条目不再占用空间；
+    被淘汰的条目如果再次出现，只会多解析一次，已添加的种子由download_manager按哈希去重。
+    """
+    def item_keys(self, item: Dict) -> List[str]:
+        """条目在索引中的键"""
+        keys = []
+        identity = item.get("guid") or item.get("link")
+        if identity:
+            keys.append(identity)
+        if item.get("hash"):
+            keys.append(item["hash"].lower())
+        return keys
+
+    def is_seen(self, item: Dict, seen: Optional[Set[str]]) -> bool:
+        """条目是否已经处理过"""
+        if not seen:
+            return False
+        return any(key in seen for key in self.item_keys(item))
+
+    async def load(self, source_ids: Iterable[int]) -> Dict[int, Set[str]]:
+        """一次性加载多个RSS源的索引"""
+        source_ids = list(source_ids)
+        index: Dict[int, Set[str]] = {source_id: set() for source_id in source_ids}
+        if not source_ids:
+            return index
+        async with async_session() as db:
+            result = await db.execute(
+                select(SeenItem.source_id, SeenItem.key).where(SeenItem.source_id.in_(source_ids))
+            )
+            for source_id, key in result:
+                index[source_id].add(key)
+        return index
+
+    async def add(self, source_id: int, items: Iterable[Dict], seen: Optional[Set[str]] = None):
+        """将条目加入索引，seen为内存中的索引时同步更新"""
+        keys = {key for item in items for key in self.item_keys(item)}
+        if seen is not None:
+            keys -= seen
+            seen.update(keys)
+        if not keys:
+            return
+        async with async_session() as db:
+            await db.execute(
+                sqlite_insert(SeenItem)
+                .values([{"source_id": source_id, "key": key} for key in keys])
+                .on_conflict_do_nothing(index_elements=["source_id", "key"])
+            )
+            # 只保留最近写入的记录
+            recent = (
+                select(SeenItem.id)
+                .where(SeenItem.source_id == source_id)
+                .order_by(SeenItem.id.desc())
+                .limit(settings.scheduler.seen_items_per_source)
+            )
+            await db.execute(
+                delete(SeenItem).where(SeenItem.source_id == source_id, SeenItem.id.not_in(recent))
+            )
+            await db.commit()
+
+    async def clear(self, source_id: int):
+        """清空RSS源的索引，下次检查时重新处理RSS中的所有条目"""
+        async with async_session() as db:
+            await db.execute(delete(SeenItem).where(SeenItem.source_id == source_id))
+            await db.commit()
+
+# 创建全局条目索引实例
+seen_items = SeenItemIndex()
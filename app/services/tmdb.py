@@ -1,6 +1,6 @@
 from typing import Optional, Dict, List
-import aiohttp
 from app.core.config import settings
+from app.services.http import http_sessions
 
 class TMDBClient:
     def __init__(self):
@@ -21,20 +21,19 @@ class TMDBClient:
             return None
         
         try:
-            async with aiohttp.ClientSession() as session:
-                url = f"{self.base_url}{endpoint}"
-                params = params or {}
-                params["api_key"] = self.api_key
-                
-                async with session.get(
-                    url,
-                    params=params,
-                    proxy=self.proxy,
-                    headers=self.headers
-                ) as response:
-                    if response.status != 200:
-                        return None
-                    return await response.json()
+            url = f"{self.base_url}{endpoint}"
+            params = params or {}
+            params["api_key"] = self.api_key
+
+            async with http_sessions.get("tmdb").get(
+                url,
+                params=params,
+                proxy=self.proxy,
+                headers=self.headers
+            ) as response:
+                if response.status != 200:
+                    return None
+                return await response.json()
         except Exception:
             return None
 
@@ -0,0 +1,44 @@
+from typing import Dict, Any, Optional
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from app.db.session import async_session
+from app.models.database import TorrentCache
+import json
+
+class TorrentFileCache:
+    """种子文件链接到解析结果的持久化缓存
+
+    同一个种子文件链接的内容不会变化，解析过一次后不再重复下载。
+    """
+    async def get(self, url: str) -> Optional[Dict[str, Any]]:
+        """获取种子文件链接的解析结果，未缓存时返回None"""
+        async with async_session() as db:
+            result = await db.execute(select(TorrentCache).where(TorrentCache.url == url))
+            cached = result.scalar_one_or_none()
+        if cached is None:
+            return None
+        return {
+            "info_hash": cached.info_hash,
+            "magnet": cached.magnet,
+            "name": cached.name,
+            "files": json.loads(cached.files) if cached.files else [],
+        }
+
+    async def put(self, url: str, torrent: Dict[str, Any]):
+        """缓存种子文件链接的解析结果"""
+        async with async_session() as db:
+            await db.execute(
+                sqlite_insert(TorrentCache)
+                .values(
+                    url=url,
+                    info_hash=torrent["info_hash"],
+                    magnet=torrent["magnet"],
+                    name=torrent["name"],
+                    files=json.dumps(torrent["files"], ensure_ascii=False),
+                )
+                .on_conflict_do_nothing(index_elements=["url"])
+            )
+            await db.commit()
+
+# 创建全局种子文件缓存实例
+torrent_cache = TorrentFileCache()
@@ -0,0 +1,127 @@
+"""订阅解析的微基准测试
+
+对比三种方式解析同一个多MB的RSS：
+- etree: 原实现，ElementTree构建完整文档树后遍历所有条目
+- lxml: app.services.feed_parsers 增量解析所有条目
+- lxml-stop: 增量解析，只处理最新的几个条目后停止（遇到已处理条目时的常见情况）
+
+每种方式在单独的子进程中运行，内存为解析期间进程峰值常驻内存的增量（包含lxml的C内存，仅支持Linux）。
+运行: python benchmarks/feed_parse.py [--items 20000] [--number 5]
+"""
+from pathlib import Path
+import argparse
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import xml.etree.ElementTree as ET
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.services.feed_parsers import iter_feed, parse_rfc822_date
+
+MAGNET_PATTERN = re.compile(r'magnet:\?xt=urn:btih:([a-zA-Z0-9]+)')
+
+def build_feed(items: int) -> str:
+    """生成一个测试用的RSS，每个条目带较长的描述"""
+    description = "<![CDATA[" + "<p>字幕组 1080p HEVC 简繁内封</p>" * 20 + "]]>"
+    entries = "".join(
+        f"<item><title>[字幕组] 测试番剧 - {i:04d} [1080p]</title>"
+        f"<link>https://example.com/episode/{i}</link>"
+        f"<guid isPermaLink=\"false\">episode-{i}</guid>"
+        f"<description>{description}</description>"
+        f"<pubDate>Mon, 01 Jan 2024 00:00:00 GMT</pubDate>"
+        f"<magnet>magnet:?xt=urn:btih:{i:040x}</magnet>"
+        f"</item>"
+        for i in range(items, 0, -1)
+    )
+    return f'<?xml version="1.0" encoding="utf-8"?><rss version="2.0"><channel><title>测试</title>{entries}</channel></rss>'
+
+def parse_etree(content: bytes) -> int:
+    """原实现：构建完整文档树，逐个条目提取字段和磁力链接"""
+    root = ET.fromstring(content)
+    count = 0
+    for item in root.findall(".//item"):
+        item.findtext("title", "").strip()
+        item.findtext("link", "").strip()
+        item.findtext("guid", "").strip()
+        parse_rfc822_date(item.findtext("pubDate", "").strip())
+        for elem in item:
+            if elem.text and MAGNET_PATTERN.search(elem.text):
+                count += 1
+                break
+    return count
+
+def parse_lxml(content: bytes, limit: int = 0) -> int:
+    count = 0
+    for kind, entry in iter_feed(content):
+        if kind != "item":
+            continue
+        for text in entry.texts():
+            if MAGNET_PATTERN.search(text):
+                count += 1
+                break
+        if limit and count >= limit:
+            break
+    return count
+
+METHODS = {
+    "etree": parse_etree,
+    "lxml": parse_lxml,
+    "lxml-stop": lambda content: parse_lxml(content, limit=2),
+}
+
+def _memory_kib(field: str) -> int:
+    """读取/proc/self/status中的内存字段（KiB）"""
+    for line in Path("/proc/self/status").read_text().splitlines():
+        if line.startswith(field + ":"):
+            return int(line.split()[1])
+    return 0
+
+def run_method(method: str, path: str, number: int):
+    """在子进程中运行一种解析方式，输出 耗时(秒) 峰值内存增量(KiB)
+
+    内存使用Linux的VmHWM统计，运行前通过clear_refs重置峰值，只统计解析期间的增量。
+    """
+    content = Path(path).read_bytes()
+    func = METHODS[method]
+    func(content)
+    Path("/proc/self/clear_refs").write_text("5")
+    before = _memory_kib("VmRSS")
+    best = None
+    for _ in range(number):
+        started = time.perf_counter()
+        func(content)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    print(best, _memory_kib("VmHWM") - before)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=20000)
+    parser.add_argument("--number", type=int, default=5)
+    parser.add_argument("--method", choices=list(METHODS), help=argparse.SUPPRESS)
+    parser.add_argument("--path", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.method:
+        run_method(args.method, args.path, args.number)
+        return
+
+    content = build_feed(args.items).encode("utf-8")
+    assert parse_etree(content) == parse_lxml(content) == args.items
+    print(f"RSS大小: {len(content) / 1024 / 1024:.1f} MiB, 条目数: {args.items}")
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / "feed.xml"
+        path.write_bytes(content)
+        for method in METHODS:
+            output = subprocess.run(
+                [sys.executable, __file__, "--method", method, "--path", str(path), "--number", str(args.number)],
+                check=True, capture_output=True, text=True
+            ).stdout.split()
+            seconds, memory = float(output[0]), int(output[1])
+            print(f"{method:>10}: {seconds * 1000:9.2f} ms, 峰值内存增量 {memory / 1024:7.1f} MiB")
+
+if __name__ == "__main__":
+    main()
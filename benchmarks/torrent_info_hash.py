@@ -0,0 +1,69 @@
+"""种子info_hash计算的微基准测试
+
+对比两种方式：
+- bencodepy: 解码整个种子文件，再重新编码info字典计算SHA1（原实现）
+- scanner: app.services.bencode 直接对原始字节中info字典的区间计算SHA1
+
+运行: python benchmarks/torrent_info_hash.py [--pieces 50000] [--files 200] [--number 20]
+"""
+from pathlib import Path
+import argparse
+import hashlib
+import os
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import bencodepy
+from app.services.bencode import TorrentMeta
+
+def build_torrent(pieces: int, files: int) -> bytes:
+    """生成一个测试用的合集种子，pieces字段大小为 pieces * 20 字节"""
+    info = {
+        b"name": "测试合集 S01".encode("utf-8"),
+        b"piece length": 4 * 1024 * 1024,
+        b"pieces": os.urandom(pieces * 20),
+        b"files": [
+            {b"length": 1024 * 1024 * 1024, b"path": [b"Season 01", f"EP{i:03d}.mkv".encode()]}
+            for i in range(files)
+        ],
+    }
+    return bencodepy.encode({
+        b"announce": b"http://tracker.example.com/announce",
+        b"announce-list": [[b"http://tracker.example.com/announce"], [b"udp://tracker.example.org:6969"]],
+        b"info": info,
+    })
+
+def bencodepy_hash(data: bytes) -> str:
+    torrent = bencodepy.decode(data)
+    return hashlib.sha1(bencodepy.encode(torrent[b"info"])).hexdigest()
+
+def scanner_hash(data: bytes) -> str:
+    return TorrentMeta(data).info_hash
+
+def peak_memory(func, data: bytes) -> int:
+    tracemalloc.start()
+    func(data)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pieces", type=int, default=50000)
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--number", type=int, default=20)
+    args = parser.parse_args()
+
+    data = build_torrent(args.pieces, args.files)
+    assert bencodepy_hash(data) == scanner_hash(data)
+    print(f"种子大小: {len(data) / 1024:.1f} KiB, 文件数: {args.files}")
+
+    for name, func in [("bencodepy", bencodepy_hash), ("scanner", scanner_hash)]:
+        seconds = min(timeit.repeat(lambda: func(data), number=args.number, repeat=3)) / args.number
+        print(f"{name:>10}: {seconds * 1000:8.3f} ms/次, 峰值内存 {peak_memory(func, data) / 1024:8.1f} KiB")
+
+if __name__ == "__main__":
+    main()
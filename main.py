@@ -8,6 +8,7 @@ from app.core.config import settings
 from app.db.session import init_db, async_session
 from app.api.endpoints import auth, source, settings as settings_endpoint, torrents
 from app.services.scheduler import scheduler
+from app.services.http import http_sessions
 from app.api.deps import get_current_user, get_token_from_request
 from app.models.database import User
 import logging
@@ -21,6 +22,9 @@ async def lifespan(app: FastAPI):
     # 初始化数据库
     logger.info("Initializing database")
     await init_db()
+
+    # 创建HTTP会话
+    await http_sessions.open()
     
     # 启动调度器
     logger.info("Starting scheduler")
@@ -30,7 +34,10 @@ async def lifespan(app: FastAPI):
     yield
     
     # 关闭调度器
-    scheduler.shutdown()
+    await scheduler.shutdown()
+
+    # 关闭HTTP会话
+    await http_sessions.close()
 
 app = FastAPI(
     title="AIAutoBangumi",
@@ -58,6 +65,7 @@ async def check_authentication(request: Request, call_next):
         "/api/auth/login", 
         "/api/auth/register",
         "/api/auth/token",
+        "/api/torrents/hooks/",  # qBittorrent回调，由接口自行校验令牌
         "/static/",
         "/docs",
         "/redoc",